@@ -0,0 +1,79 @@
+"""
+Bundle registry benchmark: memory per application, snapshot load time
+and lookup time, compared with a dict of dicts built from database rows.
+
+Run from the telegram_bot directory:
+    python benchmarks/bundle_registry.py [applications]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path[:0] = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+
+from utils.bundle_registry import BundleRegistry  # noqa: E402
+
+
+def make_rows(count: int) -> list[tuple[str, bool, int, str]]:
+    return [(f"com.example.app{i}", i % 7 != 0, 1700000000 + i, "default") for i in range(count)]
+
+
+def measure_memory(build) -> tuple[object, int]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    rows = make_rows(count)
+    ids = [row[0] for row in rows]
+
+    def build_dicts():
+        return {
+            bundle_id: {
+                "bundle_id": bundle_id,
+                "allow_execution": allowed,
+                "last_access_time": last_access,
+                "tenant": tenant
+            }
+            for bundle_id, allowed, last_access, tenant in make_rows(count)
+        }
+
+    def build_registry():
+        registry = BundleRegistry()
+        registry.replace(make_rows(count))
+        return registry
+
+    _, dicts_memory = measure_memory(build_dicts)
+    registry, registry_memory = measure_memory(build_registry)
+    print(f"applications          {count}")
+    print(f"dict of dicts         {dicts_memory / count:8.1f} bytes per application")
+    print(f"registry              {registry_memory / count:8.1f} bytes per application")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "registry.snapshot")
+        started = time.perf_counter()
+        registry.save(path)
+        print(f"snapshot save         {(time.perf_counter() - started) * 1000:8.1f} ms, "
+              f"{os.path.getsize(path) / count:.1f} bytes per application on disk")
+
+        started = time.perf_counter()
+        loaded = BundleRegistry.load(path)
+        print(f"snapshot load         {(time.perf_counter() - started) * 1000:8.1f} ms")
+        assert len(loaded) == count
+
+    started = time.perf_counter()
+    for bundle_id in ids:
+        registry.get(bundle_id)
+    print(f"lookup                {(time.perf_counter() - started) / count * 1e9:8.1f} ns per application")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Check latency with a locked SQLite database: every check through the circuit breaker
+must be answered within the breaker timeout, although the driver waits for the lock
+for the whole sqlite3 busy timeout. Exits with an error if a check takes longer.
+
+Run from the telegram_bot directory:
+    python benchmarks/locked_database.py [timeout seconds]
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path[:0] = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+sys.path[:0] = [os.path.dirname(sys.path[0])]
+
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError  # noqa: E402
+from utils.database_connector import DatabaseConnector  # noqa: E402
+
+# Time a check may take on top of the timeout, for scheduling of the event loop
+ALLOWED_OVERHEAD_SECONDS = 0.1
+
+
+async def check(breaker: CircuitBreaker, db: DatabaseConnector, bundle_id: str) -> tuple[str, float]:
+    started = time.perf_counter()
+    try:
+        await breaker.call(db.check_or_create_bundle, bundle_id)
+        outcome = "answered"
+    except CircuitOpenError:
+        outcome = "refused"
+    except asyncio.TimeoutError:
+        outcome = "timed out"
+    return outcome, time.perf_counter() - started
+
+
+async def run(timeout: float) -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "database.sqlite")
+        db = DatabaseConnector(f"sqlite+aiosqlite:///{path}")
+        await db.ensure_schema()
+        breaker = CircuitBreaker(timeout=timeout, failure_threshold=3, reset_seconds=timeout, max_concurrent=8)
+
+        lock = sqlite3.connect(path)
+        lock.execute("BEGIN EXCLUSIVE")
+        slowest = 0.0
+        try:
+            for i in range(6):
+                outcome, elapsed = await check(breaker, db, f"com.example.app{i}")
+                slowest = max(slowest, elapsed)
+                print(f"locked check {i}        {outcome:10} {elapsed * 1000:8.1f} ms, {breaker.in_flight} in flight")
+            await asyncio.sleep(timeout)
+            outcome, elapsed = await check(breaker, db, "com.example.trial")
+            slowest = max(slowest, elapsed)
+            print(f"trial check           {outcome:10} {elapsed * 1000:8.1f} ms")
+        finally:
+            lock.rollback()
+            lock.close()
+
+        while breaker.in_flight:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(timeout)
+        outcome, elapsed = await check(breaker, db, "com.example.unlocked")
+        print(f"unlocked check        {outcome:10} {elapsed * 1000:8.1f} ms, circuit open: {breaker.is_open}")
+
+    bounded = slowest <= timeout + ALLOWED_OVERHEAD_SECONDS
+    print(f"slowest locked check  {slowest * 1000:8.1f} ms, bound {(timeout + ALLOWED_OVERHEAD_SECONDS) * 1000:.0f} ms")
+    return bounded and outcome == "answered" and not breaker.is_open
+
+
+def main():
+    timeout = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    if not asyncio.run(run(timeout)):
+        sys.exit("check latency is not bounded by the circuit breaker timeout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Startup benchmark: import time of the bot and the management utility in a fresh interpreter,
+and the time to build the agent application.
+
+Run from the telegram_bot directory:
+    python benchmarks/startup.py [repeats]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+TARGETS = {
+    "import bot": "import bot",
+    "import manage": "import manage",
+    "create agent app": "from utils.http_agent import create_app; create_app()",
+}
+
+SNIPPET = "import time; started = time.perf_counter(); {code}; print(time.perf_counter() - started)"
+
+
+def measure(code: str, repeats: int) -> list[float]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(root), root, env.get("PYTHONPATH", "")])
+    env.setdefault("TELEGRAM_API_KEY", "0:benchmark")
+    env.setdefault("REDIS_HOST", "127.0.0.1")
+    env.setdefault("REDIS_PORT", "6379")
+    env.setdefault("REDIS_DB", "0")
+
+    results = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(code=code)],
+            cwd=root,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        results.append(float(output.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, code in TARGETS.items():
+        results = measure(code, repeats)
+        print(f"{name:<20} median {statistics.median(results) * 1000:8.1f} ms  min {min(results) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,24 @@
 import asyncio
 import logging
 import math
+import re
 import sys
 import uuid
 from datetime import datetime
 
 import jwt
-from aiogram import Bot, Dispatcher, F, Router, Message
+from aiogram import Bot, Dispatcher, F, Router
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.base import StorageKey
-from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.types import (
     InlineQueryResultArticle,
     InputTextMessageContent,
     InlineQuery
 )
 from pytz import timezone
+from redis.asyncio import Redis
 
 from config import *
 from telegram_bot.strings import (
@@ -39,23 +40,123 @@ from telegram_bot.strings import (
     LOGOUT_PROMPT,
     ONLY_CHAT_WITH_BOT_SUPPORT,
     ACCESS_DENIED_PLEASE_RELOGIN_PROMPT_INLINE,
-    NOT_FOUND_INLINE, EDIT_INLINE_PROMPT
+    NOT_FOUND_INLINE, EDIT_INLINE_PROMPT,
+    NEW_BUNDLES_SUBSCRIBED_PROMPT,
+    NEW_BUNDLES_UNSUBSCRIBED_PROMPT,
+    NEW_BUNDLE_BLOCKED_ALERT,
+    BUNDLE_BUTTON_EXPIRED_ALERT,
+    BUNDLE_RULES_PROMPT,
+    NO_BUNDLE_RULES,
+    DEFAULT_POLICY_ALLOW,
+    DEFAULT_POLICY_DENY,
+    ENTER_RULE_PATTERN_PROMPT,
+    INVALID_RULE_PATTERN_PROMPT,
+    BUNDLE_ACTIVITY_PROMPT,
+    BUNDLE_ACTIVITY_HOUR,
+    AUDIT_LOG_PROMPT,
+    AUDIT_LOG_OF_BUNDLE,
+    AUDIT_LOG_OF_USER,
+    AUDIT_LOG_ENTRY,
+    NO_AUDIT_EVENTS,
+    BUNDLE_SCHEDULES_PROMPT,
+    NO_BUNDLE_SCHEDULES,
+    SCHEDULE_ALLOWED,
+    SCHEDULE_BLOCKED,
+    TIMEBOX_SCHEDULE,
+    WINDOW_SCHEDULE,
+    ENTER_SCHEDULE_WINDOW_PROMPT,
+    INVALID_SCHEDULE_WINDOW_PROMPT
+)
+from utils.allowance_store import RedisAllowanceStore
+from utils.audit_log import (
+    AuditLog,
+    BLOCK_BUNDLE,
+    ALLOW_BUNDLE,
+    REMOVE_BUNDLE,
+    SET_DEFAULT_POLICY,
+    ADD_RULE,
+    REMOVE_RULE,
+    ADD_SCHEDULE,
+    REMOVE_SCHEDULE
 )
 from utils.auth_wrapper import *
-from utils.database_connector import DatabaseConnector
-from utils.http_agent import HTTPAgent
+from utils.bundle_buttons import BundleButtons, button_key
+from utils.new_bundles_digest import NewBundlesDigest
+from utils.bundle_scheduler import BundleScheduler, TIMEBOX, WINDOW
+from utils.bundle_rules import BundleRules, ALLOW_POLICY, DENY_POLICY, default_policy_setting
+from utils.database_connector import DatabaseConnector, HOUR, DAY
+from utils.invalidation import InvalidationBus
+from utils.maintenance import Maintenance
 from utils.markups import *
+from utils.ping_counters import run_ping_rollups_compaction
+from utils.session_storage import ShardedSessionStorage
 
 database = DatabaseConnector(DB_CONNECTION_STRING)
 form_router = Router()
 
-__ttl = 365 * 24 * 60 * 60
+bot: Bot | None = None
+dispatcher: Dispatcher | None = None
+new_bundles_digest: NewBundlesDigest | None = None
+bundle_buttons: BundleButtons | None = None
+invalidation: InvalidationBus | None = None
+maintenance: Maintenance | None = None
+audit_log: AuditLog | None = None
+scheduler: BundleScheduler | None = None
+background_tasks: set[asyncio.Task] = set()
 
-redis_storage = RedisStorage.from_url(REDIS_CONNECTION_STRING, data_ttl=__ttl, state_ttl=__ttl)
 
-bot = Bot(token=TELEGRAM_API_KEY)
-dispatcher = Dispatcher(storage=redis_storage)
-dispatcher.include_router(form_router)
+def create_app() -> Dispatcher:
+    """
+    Create bot, storage and services used by handlers. Nothing connects until polling starts.
+    Returns:
+        Dispatcher: Dispatcher with all routers included.
+    """
+    global bot, dispatcher, new_bundles_digest, bundle_buttons, invalidation, maintenance, audit_log, scheduler
+
+    redis = Redis.from_url(REDIS_CONNECTION_STRING)
+    session_storage = ShardedSessionStorage.from_urls()
+    bot = Bot(token=TELEGRAM_API_KEY)
+    dispatcher = Dispatcher(storage=session_storage, events_isolation=session_storage.create_isolation())
+    dispatcher.include_router(form_router)
+    new_bundles_digest = NewBundlesDigest(bot, redis)
+    bundle_buttons = new_bundles_digest.buttons
+    init_auth(database, redis)
+    invalidation = InvalidationBus(redis)
+    audit_log = AuditLog(database)
+    dispatcher.shutdown.register(audit_log.stop)
+    maintenance = Maintenance(database, notify=new_bundles_digest.send_to_subscribers, audit_log=audit_log)
+    scheduler = BundleScheduler(database)
+    if ALLOWANCE_STORE == "redis":
+        database.add_change_listener(RedisAllowanceStore(redis).on_bundles_changed)
+    database.add_change_listener(publish_bundles_changed)
+    return dispatcher
+
+
+def on_background_task_done(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Background task %s failed", task.get_coro().__qualname__, exc_info=task.exception())
+
+
+async def publish_bundles_changed(bundle_ids: list[str], _execution_status: bool | None) -> None:
+    if bundle_ids:
+        await invalidation.publish("bundles", "\n".join(bundle_ids))
+
+
+async def record_audit(state: FSMContext, action: str, bundle_id: str = None, details: str = None) -> None:
+    """
+    Record admin action made by the logged-in user. Session data is already cached for the update,
+    and the event is only enqueued, so this does not delay the handler.
+    """
+    data = await state.get_data()
+    audit_log.record(data.get("login"), action, bundle_id, details, data.get("tenant", DEFAULT_TENANT))
+
+
+async def current_tenant(state: FSMContext) -> str:
+    """
+    Get tenant of the logged-in user, check_auth has already verified it against the database or its recent answer.
+    """
+    return (await state.get_data())["tenant"]
 
 
 class Login(StatesGroup):
@@ -65,6 +166,8 @@ class Login(StatesGroup):
 
 class MainMenu(StatesGroup):
     main_page = State()
+    rule_pattern = State()
+    schedule_window = State()
 
 
 @form_router.message(CommandStart())
@@ -79,8 +182,7 @@ async def password_page(message: Message, state: FSMContext):
         await message.answer(LOGIN_MUST_BE_TEXT_PROMPT)
         return
 
-    await state.update_data(login=message.text)
-    await state.update_data(login_msg_id=message.message_id)
+    await state.update_data(login=message.text, login_msg_id=message.message_id)
     await state.set_state(Login.password)
     await message.answer(ENTER_PASSWORD_PROMPT)
 
@@ -93,12 +195,15 @@ async def password_verify(message: Message, state: FSMContext) -> None:
         return None
 
     if await database.validate_user(data["login"], message.text):
+        tenant = await database.get_user_tenant(data["login"])
         await state.update_data(
             jwt_key=jwt.encode(
-                {"valid_until": int(time.time()) + int(getenv("JWT_TTL_SECONDS"))},
+                {"valid_until": int(time.time()) + int(getenv("JWT_TTL_SECONDS")), "tenant": tenant},
                 getenv("JWT_KEY"),
                 "HS256"
-            )
+            ),
+            tenant=tenant,
+            tenant_check=None
         )
         await main_menu(message, state)
         await bot.delete_messages(message.chat.id, [data["login_msg_id"], message.message_id])
@@ -120,8 +225,9 @@ async def main_menu(message: Message, state: FSMContext) -> None:
 async def jump_to_edit(message: Message, state: FSMContext) -> None:
     bundle_name = message.text.split(" ")[1]
     try:
-        bundle_status, last_access = await database.get_bundle_info(bundle_name)
+        bundle_status, last_access = await database.get_bundle_info(bundle_name, await current_tenant(state))
         bundle_status_text = BUNDLE_EXECUTION_ALLOWED_PROMPT if bundle_status else BUNDLE_EXECUTION_DENIED_PROMPT
+        await bundle_buttons.remember([bundle_name])
         await message.answer(
             text=BUNDLE_INFO.format(
                 bundle_name=bundle_name,
@@ -139,17 +245,18 @@ async def jump_to_edit(message: Message, state: FSMContext) -> None:
 @check_auth(on_auth_fail=check_auth)
 async def init_list_bundles(message: Message, state: FSMContext) -> None:
     limit = APPS_ON_PAGE
-    count_rows, bundles = await database.get_bundles_list(limit, 0)
+    count_rows, bundles = await database.get_bundles_list(limit, 0, await current_tenant(state))
     pages = math.ceil(count_rows / limit)
     payload_for_inline_widget = []
 
     if count_rows > 0:
+        await bundle_buttons.remember([bundle[0] for bundle in bundles])
         for bundle in bundles:
             status = "✅" if bundle[1] else "❌"
             payload_for_inline_widget.append(
                 {
                     "text": f"{status} - {bundle[0]}",
-                    "callback_data": f"control_bundle@{bundle[0]}"
+                    "callback_data": f"control_bundle@{button_key(bundle[0])}"
                 }
             )
 
@@ -164,33 +271,209 @@ async def init_list_bundles(message: Message, state: FSMContext) -> None:
 @form_router.callback_query(MainMenu.main_page, F.data.startswith("control_bundle"))
 @check_auth(on_auth_fail=check_auth)
 async def control_bundle(call: CallbackQuery, state: FSMContext) -> None:
-    bundle_status, last_access = await database.get_bundle_info(call.data.split("@")[1])
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is not None:
+        await bundle_screen(call, state, bundle_id)
+
+
+async def resolve_bundle_button(call: CallbackQuery, key: str) -> str | None:
+    """
+    Get application id of a per-application button, or tell the user that the message is too old.
+    """
+    bundle_id = await bundle_buttons.resolve(key)
+    if bundle_id is None:
+        await call.answer(BUNDLE_BUTTON_EXPIRED_ALERT, show_alert=True)
+    return bundle_id
+
+
+async def bundle_screen(call: CallbackQuery, state: FSMContext, bundle_id: str) -> None:
+    bundle_status, last_access = await database.get_bundle_info(bundle_id, await current_tenant(state))
     bundle_status_text = BUNDLE_EXECUTION_ALLOWED_PROMPT if bundle_status else BUNDLE_EXECUTION_DENIED_PROMPT
 
+    # Buttons of the screen stay valid for BUNDLE_BUTTON_TTL_SECONDS from the last time it was shown
+    await bundle_buttons.remember([bundle_id])
     await call.message.edit_text(
         text=BUNDLE_INFO.format(
-            bundle_name=call.data.split("@")[1],
+            bundle_name=bundle_id,
             bundle_status=bundle_status_text,
             last_access=datetime.fromtimestamp(last_access, tz=timezone(TIMEZONE)).strftime("%d/%m/%Y, %H:%M:%S")
         ),
-        reply_markup=edit_bundle_inline_markup(call.data.split("@")[1], bundle_status)
+        reply_markup=edit_bundle_inline_markup(bundle_id, bundle_status)
+    )
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("bundle_activity"))
+@check_auth(on_auth_fail=check_auth)
+async def bundle_activity(call: CallbackQuery, state: FSMContext) -> None:
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await database.get_bundle_info(bundle_id, await current_tenant(state))
+    now = int(time.time())
+    rollups = await database.get_bundle_activity(bundle_id, now - 7 * DAY)
+
+    hourly = {}
+    for resolution, bucket_start, count in rollups:
+        hour = bucket_start - bucket_start % HOUR
+        hourly[hour] = hourly.get(hour, 0) + count
+    current_hour = now - now % HOUR
+    hours = [current_hour - i * HOUR for i in range(11, -1, -1)]
+
+    await call.message.edit_text(
+        text=BUNDLE_ACTIVITY_PROMPT.format(
+            bundle_name=bundle_id,
+            last_hour=sum(count for _, bucket_start, count in rollups if bucket_start >= now - HOUR),
+            last_day=sum(count for _, bucket_start, count in rollups if bucket_start >= now - DAY),
+            last_week=sum(count for _, _, count in rollups),
+            hourly="\n".join(
+                BUNDLE_ACTIVITY_HOUR.format(
+                    hour=datetime.fromtimestamp(hour, tz=timezone(TIMEZONE)).strftime("%d/%m, %H:00"),
+                    count=hourly.get(hour, 0)
+                )
+                for hour in hours
+            )
+        ),
+        reply_markup=back_to_bundle_inline_markup(bundle_id)
     )
 
 
+def describe_schedule(schedule) -> str:
+    status = SCHEDULE_ALLOWED if schedule.allow else SCHEDULE_BLOCKED
+    if schedule.kind == TIMEBOX:
+        until = datetime.fromtimestamp(schedule.ends_at, tz=timezone(TIMEZONE)).strftime("%d/%m, %H:%M")
+        return TIMEBOX_SCHEDULE.format(status=status, until=until)
+    return WINDOW_SCHEDULE.format(
+        status=status,
+        start=f"{schedule.window_start // 60:02}:{schedule.window_start % 60:02}",
+        end=f"{schedule.window_end // 60:02}:{schedule.window_end % 60:02}",
+        other_status=SCHEDULE_BLOCKED if schedule.allow else SCHEDULE_ALLOWED
+    )
+
+
+async def bundle_schedules_screen(bundle_id: str) -> tuple[str, InlineKeyboardMarkup]:
+    schedules = [(schedule.id, describe_schedule(schedule)) for schedule in await database.get_schedules(bundle_id)]
+    await bundle_buttons.remember([bundle_id])
+    text = BUNDLE_SCHEDULES_PROMPT.format(
+        bundle_name=bundle_id,
+        timezone=TIMEZONE,
+        schedules="\n".join(description for _, description in schedules) or NO_BUNDLE_SCHEDULES
+    )
+    return text, bundle_schedules_inline_markup(bundle_id, schedules)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("bundle_schedules"))
+@check_auth(on_auth_fail=check_auth)
+async def bundle_schedules(call: CallbackQuery, state: FSMContext) -> None:
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await database.get_bundle_info(bundle_id, await current_tenant(state))
+    text, markup = await bundle_schedules_screen(bundle_id)
+    await call.message.edit_text(text, reply_markup=markup)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("block_for"))
+@check_auth(on_auth_fail=check_auth)
+async def block_bundle_for(call: CallbackQuery, state: FSMContext) -> None:
+    _, hours, key = call.data.split("@", 2)
+    bundle_id = await resolve_bundle_button(call, key)
+    if bundle_id is None:
+        return
+    bundle_status, _ = await database.get_bundle_info(bundle_id, await current_tenant(state))
+    schedule_id = await database.add_schedule(
+        bundle_id,
+        TIMEBOX,
+        allow=False,
+        ends_at=int(time.time()) + int(hours) * HOUR,
+        restore=bundle_status
+    )
+    await scheduler.add(schedule_id)
+    await record_audit(state, ADD_SCHEDULE, bundle_id, f"block for {hours} h")
+    text, markup = await bundle_schedules_screen(bundle_id)
+    await call.message.edit_text(text, reply_markup=markup)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("add_window"))
+@check_auth(on_auth_fail=check_auth)
+async def init_add_schedule_window(call: CallbackQuery, state: FSMContext) -> None:
+    _, action, key = call.data.split("@", 2)
+    bundle_id = await resolve_bundle_button(call, key)
+    if bundle_id is None:
+        return
+    await database.get_bundle_info(bundle_id, await current_tenant(state))
+    await state.update_data(schedule_bundle_id=bundle_id, schedule_allow=action == ALLOW_POLICY)
+    await state.set_state(MainMenu.schedule_window)
+    await call.message.answer(ENTER_SCHEDULE_WINDOW_PROMPT.format(timezone=TIMEZONE))
+    await call.answer()
+
+
+@form_router.message(MainMenu.schedule_window)
+@check_auth(on_auth_fail=check_auth)
+async def add_schedule_window(message: Message, state: FSMContext) -> None:
+    await state.set_state(MainMenu.main_page)
+    match = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*", message.text or "")
+    if match is None:
+        await message.answer(INVALID_SCHEDULE_WINDOW_PROMPT)
+        return
+    start_hour, start_minute, end_hour, end_minute = (int(group) for group in match.groups())
+    if max(start_hour, end_hour) > 23 or max(start_minute, end_minute) > 59:
+        await message.answer(INVALID_SCHEDULE_WINDOW_PROMPT)
+        return
+    window_start, window_end = start_hour * 60 + start_minute, end_hour * 60 + end_minute
+    if window_start == window_end:
+        await message.answer(INVALID_SCHEDULE_WINDOW_PROMPT)
+        return
+
+    data = await state.get_data()
+    bundle_id = data["schedule_bundle_id"]
+    schedule_id = await database.add_schedule(
+        bundle_id,
+        WINDOW,
+        allow=data["schedule_allow"],
+        window_start=window_start,
+        window_end=window_end
+    )
+    await scheduler.add(schedule_id)
+    await record_audit(
+        state,
+        ADD_SCHEDULE,
+        bundle_id,
+        f"{ALLOW_POLICY if data['schedule_allow'] else DENY_POLICY} {message.text.strip()}"
+    )
+    text, markup = await bundle_schedules_screen(bundle_id)
+    await message.answer(text, reply_markup=markup)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("remove_schedule"))
+@check_auth(on_auth_fail=check_auth)
+async def remove_schedule(call: CallbackQuery, state: FSMContext) -> None:
+    schedules = await database.get_schedules(schedule_ids=[int(call.data.split("@")[1])])
+    if not schedules:
+        await call.answer()
+        return
+    schedule = schedules[0]
+    await database.get_bundle_info(schedule.bundle_id, await current_tenant(state))
+    await scheduler.remove(schedule.id)
+    await record_audit(state, REMOVE_SCHEDULE, schedule.bundle_id, describe_schedule(schedule))
+    text, markup = await bundle_schedules_screen(schedule.bundle_id)
+    await call.message.edit_text(text, reply_markup=markup)
+
+
 @form_router.callback_query(MainMenu.main_page, F.data.startswith("view_apps"))
 @check_auth(on_auth_fail=check_auth)
 async def init_control_app(call: CallbackQuery, state: FSMContext) -> None:
     page = int(call.data.split("@")[1])
     offset = page * APPS_ON_PAGE
-    count_rows, bundles = await database.get_bundles_list(APPS_ON_PAGE, offset)
+    count_rows, bundles = await database.get_bundles_list(APPS_ON_PAGE, offset, await current_tenant(state))
     pages = math.ceil(count_rows / APPS_ON_PAGE)
     payload_for_inline_widget = []
 
+    await bundle_buttons.remember([bundle[0] for bundle in bundles])
     for bundle in bundles:
         status = "✅" if bundle[1] else "❌"
         payload_for_inline_widget.append({
             "text": f"{status} - {bundle[0]}",
-            "callback_data": f"control_bundle@{bundle[0]}"
+            "callback_data": f"control_bundle@{button_key(bundle[0])}"
         })
     new_markup = generate_inline_buttons_with_pagination(payload_for_inline_widget, page, pages, "view_apps")[0]
 
@@ -206,28 +489,190 @@ async def init_control_app(call: CallbackQuery, state: FSMContext) -> None:
 @form_router.callback_query(MainMenu.main_page, F.data.startswith("block_bundle"))
 @check_auth(on_auth_fail=check_auth)
 async def block_app(call: CallbackQuery, state: FSMContext) -> None:
-    bundle_id = call.data.split("@")[1]
-    await database.change_execution_for_bundle(bundle_id, False)
-    await control_bundle(call, state)
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await database.change_execution_for_bundle(bundle_id, False, await current_tenant(state))
+    await record_audit(state, BLOCK_BUNDLE, bundle_id)
+    await bundle_screen(call, state, bundle_id)
 
 
 @form_router.callback_query(MainMenu.main_page, F.data.startswith("allow_bundle"))
 @check_auth(on_auth_fail=check_auth)
 async def allow_app(call: CallbackQuery, state: FSMContext) -> None:
-    bundle_id = call.data.split("@")[1]
-    await database.change_execution_for_bundle(bundle_id, True)
-    await control_bundle(call, state)
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await database.change_execution_for_bundle(bundle_id, True, await current_tenant(state))
+    await record_audit(state, ALLOW_BUNDLE, bundle_id)
+    await bundle_screen(call, state, bundle_id)
 
 
 @form_router.callback_query(MainMenu.main_page, F.data.startswith("remove_bundle"))
 @check_auth(on_auth_fail=check_auth)
 async def remove_app(call: CallbackQuery, state: FSMContext) -> None:
-    bundle_id = call.data.split("@")[1]
-    await database.remove_bundle(bundle_id)
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await database.remove_bundle(bundle_id, await current_tenant(state))
+    await record_audit(state, REMOVE_BUNDLE, bundle_id)
     await call.message.edit_text(BUNDLE_REMOVED_PROMPT)
     await init_list_bundles(call.message, state)
 
 
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("block_new_bundle"))
+@check_auth(on_auth_fail=check_auth)
+async def block_new_app(call: CallbackQuery, state: FSMContext) -> None:
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await database.change_execution_for_bundle(bundle_id, False, await current_tenant(state))
+    await record_audit(state, BLOCK_BUNDLE, bundle_id, "from new apps digest")
+    await call.answer(NEW_BUNDLE_BLOCKED_ALERT.format(bundle=bundle_id))
+
+    keyboard = [row for row in call.message.reply_markup.inline_keyboard if row[0].callback_data != call.data]
+    await call.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+
+
+@form_router.message(MainMenu.main_page, F.text == NEW_BUNDLES_NOTIFICATIONS_BUTTON)
+@check_auth(on_auth_fail=check_auth)
+async def toggle_new_bundles_digest(message: Message, state: FSMContext) -> None:
+    tenant = await current_tenant(state)
+    if await new_bundles_digest.is_subscribed(message.chat.id, tenant):
+        await new_bundles_digest.unsubscribe(message.chat.id, tenant)
+        await message.answer(NEW_BUNDLES_UNSUBSCRIBED_PROMPT)
+    else:
+        await new_bundles_digest.subscribe(message.chat.id, tenant)
+        await message.answer(NEW_BUNDLES_SUBSCRIBED_PROMPT)
+
+
+async def bundle_rules_screen(tenant: str) -> tuple[str, InlineKeyboardMarkup]:
+    default_policy = await database.get_setting(default_policy_setting(tenant), DEFAULT_BUNDLE_POLICY)
+    rules = await database.get_bundle_rules(tenant)
+    allow = [pattern for _, action, pattern in rules if action == ALLOW_POLICY]
+    deny = [pattern for _, action, pattern in rules if action == DENY_POLICY]
+    text = BUNDLE_RULES_PROMPT.format(
+        policy=DEFAULT_POLICY_ALLOW if default_policy == ALLOW_POLICY else DEFAULT_POLICY_DENY,
+        allow="\n".join(allow) or NO_BUNDLE_RULES,
+        deny="\n".join(deny) or NO_BUNDLE_RULES
+    )
+    return text, bundle_rules_inline_markup(rules)
+
+
+@form_router.message(MainMenu.main_page, F.text == BUNDLE_RULES_BUTTON)
+@check_auth(on_auth_fail=check_auth)
+async def init_bundle_rules(message: Message, state: FSMContext) -> None:
+    text, markup = await bundle_rules_screen(await current_tenant(state))
+    await message.answer(text, reply_markup=markup)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data == "switch_default_policy")
+@check_auth(on_auth_fail=check_auth)
+async def switch_default_policy(call: CallbackQuery, state: FSMContext) -> None:
+    tenant = await current_tenant(state)
+    default_policy = await database.get_setting(default_policy_setting(tenant), DEFAULT_BUNDLE_POLICY)
+    default_policy = DENY_POLICY if default_policy == ALLOW_POLICY else ALLOW_POLICY
+    await database.set_setting(default_policy_setting(tenant), default_policy)
+    await record_audit(state, SET_DEFAULT_POLICY, details=default_policy)
+    await invalidation.publish("rules")
+    text, markup = await bundle_rules_screen(await current_tenant(state))
+    await call.message.edit_text(text, reply_markup=markup)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("add_rule"))
+@check_auth(on_auth_fail=check_auth)
+async def init_add_bundle_rule(call: CallbackQuery, state: FSMContext) -> None:
+    await state.update_data(rule_action=call.data.split("@")[1])
+    await state.set_state(MainMenu.rule_pattern)
+    await call.message.answer(ENTER_RULE_PATTERN_PROMPT)
+    await call.answer()
+
+
+@form_router.message(MainMenu.rule_pattern)
+@check_auth(on_auth_fail=check_auth)
+async def add_bundle_rule(message: Message, state: FSMContext) -> None:
+    await state.set_state(MainMenu.main_page)
+    try:
+        BundleRules.validate_pattern(message.text or "")
+    except ValueError as e:
+        await message.answer(INVALID_RULE_PATTERN_PROMPT.format(error=e))
+        return
+
+    data = await state.get_data()
+    await database.add_bundle_rule(data["rule_action"], message.text, data["tenant"])
+    await record_audit(state, ADD_RULE, details=f"{data['rule_action']} {message.text}")
+    await invalidation.publish("rules")
+    text, markup = await bundle_rules_screen(await current_tenant(state))
+    await message.answer(text, reply_markup=markup)
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("remove_rule"))
+@check_auth(on_auth_fail=check_auth)
+async def remove_bundle_rule(call: CallbackQuery, state: FSMContext) -> None:
+    rule_id = int(call.data.split("@")[1])
+    await database.remove_bundle_rule(rule_id, await current_tenant(state))
+    await record_audit(state, REMOVE_RULE, details=f"#{rule_id}")
+    await invalidation.publish("rules")
+    text, markup = await bundle_rules_screen(await current_tenant(state))
+    await call.message.edit_text(text, reply_markup=markup)
+
+
+async def audit_log_screen(tenant: str, bundle_id: str = None, actor: str = None) -> str:
+    events = await database.get_audit_events(
+        bundle_id=bundle_id,
+        actor=actor,
+        limit=AUDIT_LOG_ENTRIES_ON_SCREEN,
+        tenant=tenant
+    )
+    if bundle_id is not None:
+        scope = AUDIT_LOG_OF_BUNDLE.format(bundle=bundle_id)
+    elif actor is not None:
+        scope = AUDIT_LOG_OF_USER.format(user=actor)
+    else:
+        scope = ""
+    entries = "\n".join(
+        AUDIT_LOG_ENTRY.format(
+            time=datetime.fromtimestamp(created_at, tz=timezone(TIMEZONE)).strftime("%d/%m/%Y, %H:%M:%S"),
+            actor=event_actor,
+            action=" ".join(
+                part for part in (action, event_bundle_id if bundle_id is None else None, details) if part
+            )
+        )
+        for created_at, event_actor, action, event_bundle_id, details in events
+    )
+    return AUDIT_LOG_PROMPT.format(scope=scope, entries=entries or NO_AUDIT_EVENTS)
+
+
+@form_router.message(MainMenu.main_page, F.text == AUDIT_LOG_BUTTON)
+@check_auth(on_auth_fail=check_auth)
+async def audit_log_recent(message: Message, state: FSMContext) -> None:
+    await message.answer(await audit_log_screen(await current_tenant(state)))
+
+
+@form_router.message(MainMenu.main_page, Command("audit"))
+@check_auth(on_auth_fail=check_auth)
+async def audit_log_of_user(message: Message, state: FSMContext) -> None:
+    """
+    /audit <login> shows actions of the user, /audit alone shows all actions.
+    """
+    args = message.text.split(maxsplit=1)
+    await message.answer(
+        await audit_log_screen(await current_tenant(state), actor=args[1].strip() if len(args) > 1 else None)
+    )
+
+
+@form_router.callback_query(MainMenu.main_page, F.data.startswith("bundle_audit"))
+@check_auth(on_auth_fail=check_auth)
+async def bundle_audit_log(call: CallbackQuery, state: FSMContext) -> None:
+    bundle_id = await resolve_bundle_button(call, call.data.split("@")[1])
+    if bundle_id is None:
+        return
+    await call.message.edit_text(
+        await audit_log_screen(await current_tenant(state), bundle_id=bundle_id),
+        reply_markup=back_to_bundle_inline_markup(bundle_id)
+    )
+
+
 @form_router.message(MainMenu.main_page, F.text == LOGOUT_BUTTON)
 @check_auth(on_auth_fail=check_auth)
 async def init_logout(message: Message, state: FSMContext) -> None:
@@ -278,8 +723,9 @@ async def inline_echo(inline_query: InlineQuery) -> None:
                 await bot.answer_inline_query(inline_query.id, results=[item], cache_time=1)
             else:
                 jwt_data = jwt.decode(data["jwt_key"], key=getenv("JWT_KEY"), algorithms="HS256")
-                if jwt_data["valid_until"] > time.time():
-                    data = await database.search_by_bundle_id(inline_query.query)
+                tenant = await database.get_user_tenant(data.get("login"))
+                if jwt_data["valid_until"] > time.time() and tenant is not None and jwt_data.get("tenant") == tenant:
+                    data = await database.search_by_bundle_id(inline_query.query, tenant=tenant)
                     if len(data) == 0:
                         result_id = str(uuid.uuid4())
                         item = InlineQueryResultArticle(
@@ -320,7 +766,21 @@ async def inline_echo(inline_query: InlineQuery) -> None:
 
 
 async def main():
-    HTTPAgent()
+    from utils.http_agent import start_http_agent
+
+    create_app()
+    await database.ensure_schema()
+    start_http_agent()
+    await audit_log.start()
+    for coroutine in (
+            new_bundles_digest.run(),
+            run_ping_rollups_compaction(database),
+            maintenance.run(),
+            scheduler.run()
+    ):
+        task = asyncio.create_task(coroutine)
+        background_tasks.add(task)
+        task.add_done_callback(on_background_task_done)
     await dispatcher.start_polling(bot)
 
 
@@ -15,3 +15,50 @@ APPS_ON_PAGE = 10
 APP_ID_HEADER = os.getenv("APP_ID_HEADER", "APP_ID")
 OK_RESPONSE = os.getenv("OK_RESPONSE", "OK")
 BLOCKED_RESPONSE = os.getenv("BLOCKED_RESPONSE", "BLOCKED")
+NEW_BUNDLES_STREAM = os.getenv("NEW_BUNDLES_STREAM", "access_bot:new_bundles")
+NEW_BUNDLES_STREAM_MAX_LEN = 10000
+DIGEST_SUBSCRIBERS_KEY = "access_bot:digest_subscribers"
+DIGEST_INTERVAL_SECONDS = int(os.getenv("DIGEST_INTERVAL_SECONDS", "300"))
+DIGEST_MAX_BUNDLES_IN_TEXT = 20
+DIGEST_MAX_BUTTONS = 10
+BUNDLE_BUTTON_KEY_PREFIX = "access_bot:bundle_button"
+BUNDLE_BUTTON_TTL_SECONDS = 7 * 24 * 60 * 60
+APP_ID_MAX_LENGTH = int(os.getenv("APP_ID_MAX_LENGTH", "255"))
+APP_ID_CHARSET = os.getenv("APP_ID_CHARSET", "[A-Za-z0-9._-]+")
+DEFAULT_BUNDLE_POLICY = os.getenv("DEFAULT_BUNDLE_POLICY", "allow")
+INVALIDATION_CHANNEL = "access_bot:invalidation"
+PING_FLUSH_INTERVAL_SECONDS = int(os.getenv("PING_FLUSH_INTERVAL_SECONDS", "10"))
+PING_COMPACT_INTERVAL_SECONDS = 3600
+PING_MINUTE_RETENTION_SECONDS = int(os.getenv("PING_MINUTE_RETENTION_SECONDS", str(2 * 24 * 60 * 60)))
+PING_HOUR_RETENTION_SECONDS = int(os.getenv("PING_HOUR_RETENTION_SECONDS", str(30 * 24 * 60 * 60)))
+PING_DAY_RETENTION_SECONDS = int(os.getenv("PING_DAY_RETENTION_SECONDS", str(365 * 24 * 60 * 60)))
+STALE_BUNDLE_DAYS = int(os.getenv("STALE_BUNDLE_DAYS", "180"))
+STALE_BUNDLE_ACTION = os.getenv("STALE_BUNDLE_ACTION", "archive")
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", str(24 * 60 * 60)))
+MAINTENANCE_BATCH_SIZE = 500
+ALLOWANCE_STORE = os.getenv("ALLOWANCE_STORE", "sql")
+ALLOWANCE_KEY = "access_bot:allowance"
+ALLOWANCE_PINGS_KEY = "access_bot:last_ping"
+ALLOWANCE_RECONCILE_LOCK_KEY = "access_bot:allowance_reconcile_lock"
+ALLOWANCE_RECONCILE_INTERVAL_SECONDS = int(os.getenv("ALLOWANCE_RECONCILE_INTERVAL_SECONDS", "60"))
+BUNDLE_REGISTRY_SNAPSHOT = f"{os.path.dirname(os.path.abspath(__file__))}/data/bundle_registry.snapshot"
+BUNDLE_REGISTRY_RELOAD_SECONDS = int(os.getenv("BUNDLE_REGISTRY_RELOAD_SECONDS", "300"))
+SESSION_REDIS_URLS = (os.getenv("SESSION_REDIS_URLS") or REDIS_CONNECTION_STRING).split(",")
+SESSION_KEY_PREFIX = os.getenv("SESSION_KEY_PREFIX", "access_bot:session")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+USER_EPOCH_KEY_PREFIX = "access_bot:user_epoch"
+USER_TENANT_CHECK_SECONDS = 300
+AUDIT_LOG_FILE = os.getenv("AUDIT_LOG_FILE", "")
+AUDIT_LOG_FLUSH_SECONDS = 1
+AUDIT_LOG_ENTRIES_ON_SCREEN = 20
+SCHEDULE_BLOCK_HOURS = (1, 2, 8, 24)
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+TENANT_HEADER = os.getenv("TENANT_HEADER", "TENANT")
+VERIFY_DB_TIMEOUT_SECONDS = float(os.getenv("VERIFY_DB_TIMEOUT_SECONDS", "0.5"))
+VERIFY_REDIS_TIMEOUT_SECONDS = float(os.getenv("VERIFY_REDIS_TIMEOUT_SECONDS", "0.2"))
+VERIFY_DB_MAX_CONCURRENCY = int(os.getenv("VERIFY_DB_MAX_CONCURRENCY", "32"))
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "10"))
+DEGRADED_BUNDLE_POLICY = os.getenv("DEGRADED_BUNDLE_POLICY", DEFAULT_BUNDLE_POLICY)
+UNKNOWN_BUNDLE_CACHE_SECONDS = int(os.getenv("UNKNOWN_BUNDLE_CACHE_SECONDS", "60"))
+UNKNOWN_BUNDLE_CACHE_SIZE = 100000
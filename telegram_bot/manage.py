@@ -1,15 +1,102 @@
 import asyncio
 import os
+from datetime import datetime
 
 from dotenv import load_dotenv
 
-from utils.database_connector import DatabaseConnector
-
 if ".env" in os.listdir("."):
     load_dotenv(".env")
 from config import *
 
-database = DatabaseConnector(DB_CONNECTION_STRING)
+MANAGE_ACTOR = "manage.py"
+
+database = None
+audit_log = None
+
+
+def get_database():
+    """
+    Import the database layer and check the schema on first use,
+    so the menu is shown without waiting for SQLAlchemy and passlib.
+    """
+    global database
+    if database is None:
+        from utils.database_connector import DatabaseConnector
+
+        database = DatabaseConnector(DB_CONNECTION_STRING)
+        asyncio.run(database.ensure_schema())
+    return database
+
+
+def get_audit_log():
+    global audit_log
+    if audit_log is None:
+        from utils.audit_log import AuditLog
+
+        audit_log = AuditLog(get_database())
+    return audit_log
+
+
+def record_audit(action: str, bundle_id: str = None, details: str = None, tenant: str = DEFAULT_TENANT) -> None:
+    """
+    Record admin action and write it at once, there is no background writer in the CLI.
+    """
+    get_audit_log().record(MANAGE_ACTOR, action, bundle_id, details, tenant)
+    if not asyncio.run(audit_log.flush()):
+        print("Failed to write the audit log, the action will be recorded with the next one")
+
+
+def publish_invalidation(topic: str, payloads: list[str] = ("",)) -> bool:
+    """
+    Tell running agents to reload cached state, e.g. tenant quotas or applications.
+    Args:
+        topic (str): Invalidation topic.
+        payloads (list[str]): Messages to publish on the topic.
+    Returns:
+        bool: True if the messages were published.
+    """
+    from redis.asyncio import Redis
+    from utils.invalidation import InvalidationBus
+
+    async def publish():
+        redis = Redis.from_url(REDIS_CONNECTION_STRING)
+        try:
+            invalidation = InvalidationBus(redis)
+            for payload in payloads:
+                await invalidation.publish(topic, payload)
+        finally:
+            await redis.aclose()
+
+    try:
+        asyncio.run(publish())
+        return True
+    except Exception:  # noqa
+        return False
+
+
+def publish_tenants_changed() -> None:
+    if not publish_invalidation("tenants"):
+        print("Failed to notify the agents, tenant changes are applied after their restart")
+
+
+def invalidate_user_sessions(login: str) -> None:
+    """
+    Make bot sessions of the user check the user in the database on their next update,
+    instead of relying on the tenant check cached in the session.
+    """
+    from redis.asyncio import Redis
+
+    async def increment_epoch():
+        redis = Redis.from_url(REDIS_CONNECTION_STRING)
+        try:
+            await redis.incr(f"{USER_EPOCH_KEY_PREFIX}:{login}")
+        finally:
+            await redis.aclose()
+
+    try:
+        asyncio.run(increment_epoch())
+    except Exception:  # noqa
+        print(f"Failed to notify the bot, open sessions notice the change within {USER_TENANT_CHECK_SECONDS} seconds")
 
 
 def validate_int(string: str) -> bool:
@@ -49,31 +136,162 @@ def infinite_input_yes_no(prompt: str) -> bool:
 
 
 def add_user():
+    from utils.audit_log import CREATE_USER
+
     username = infinite_input_str("username> ")
     password = infinite_input_str("password> ")
+    tenant = input(f"tenant [{DEFAULT_TENANT}]> ").strip() or DEFAULT_TENANT
+    database = get_database()
     if not asyncio.run(database.is_exists(username)):
-        asyncio.run(database.create_user(username, password))
+        asyncio.run(database.create_user(username, password, tenant))
+        record_audit(CREATE_USER, details=username, tenant=tenant)
+        publish_tenants_changed()
         print("User created successfully")
     else:
         print("The user already exists")
 
 
 def reset_user_pass():
+    from utils.audit_log import CHANGE_PASSWORD
+
+    database = get_database()
     usernames = asyncio.run(database.get_usernames())
     for username_idx in range(len(usernames)):
         print(f"{username_idx + 1}. {usernames[username_idx]}")
     user_id = infinite_input_int("User number> ", 1, len(usernames))
     password = infinite_input_str("password> ")
     asyncio.run(database.change_password(usernames[user_id - 1], password))
+    record_audit(CHANGE_PASSWORD, details=usernames[user_id - 1])
 
 
 def remove_user():
+    from utils.audit_log import REMOVE_USER
+
+    database = get_database()
     usernames = asyncio.run(database.get_usernames())
     for username_idx in range(len(usernames)):
         print(f"{username_idx + 1}. {usernames[username_idx]}")
     user_id = infinite_input_int("User number> ", 1, len(usernames))
     if infinite_input_yes_no("are you sure? [y/n]> "):
         asyncio.run(database.remove_user(usernames[user_id - 1]))
+        invalidate_user_sessions(usernames[user_id - 1])
+        record_audit(REMOVE_USER, details=usernames[user_id - 1])
+
+
+def reap_stale_bundles():
+    from pytz import timezone
+    from utils.maintenance import Maintenance
+
+    maintenance = Maintenance(get_database(), audit_log=get_audit_log())
+    count, bundles = asyncio.run(maintenance.dry_run())
+    print(f"Applications without checks for {maintenance.stale_days} days: {count}")
+    for bundle_id, last_access in bundles:
+        last_access = datetime.fromtimestamp(last_access, tz=timezone(TIMEZONE)).strftime("%d/%m/%Y, %H:%M:%S")
+        print(f"{bundle_id} - last check {last_access}")
+    if count > len(bundles):
+        print(f"...and {count - len(bundles)} more")
+    if count == 0:
+        return
+
+    action = "Archive" if maintenance.archive else "Delete"
+    if infinite_input_yes_no(f"{action} {count} applications? [y/n]> "):
+        reaped = []
+
+        async def collect_reaped(bundle_ids: list[str], _execution_status: bool | None) -> None:
+            reaped.append("\n".join(bundle_ids))
+
+        get_database().add_change_listener(collect_reaped)
+        try:
+            print(asyncio.run(maintenance.run_once(actor=MANAGE_ACTOR)))
+        finally:
+            database.change_listeners.remove(collect_reaped)
+        if reaped and not publish_invalidation("bundles", reaped):
+            print("Failed to notify the agents, they drop the reaped applications on their next full reload")
+        if not asyncio.run(audit_log.flush()):
+            print("Failed to write the audit log, the action will be recorded with the next one")
+
+
+def show_audit_log():
+    from pytz import timezone
+
+    print("1. Latest actions")
+    print("2. Actions with an application")
+    print("3. Actions of a user")
+    scope = infinite_input_int("> ", 1, 3)
+    bundle_id = infinite_input_str("Application id> ") if scope == 2 else None
+    actor = infinite_input_str("User> ") if scope == 3 else None
+    events = asyncio.run(get_database().get_audit_events(bundle_id=bundle_id, actor=actor, limit=50))
+    if not events:
+        print("No recorded actions")
+    for created_at, event_actor, action, event_bundle_id, details in events:
+        created_at = datetime.fromtimestamp(created_at, tz=timezone(TIMEZONE)).strftime("%d/%m/%Y, %H:%M:%S")
+        print(f"{created_at} - {event_actor}: " + " ".join(part for part in (action, event_bundle_id, details) if part))
+
+
+def manage_tenants():
+    database = get_database()
+    print("1. List tenants")
+    print("2. Set tenant quotas")
+    print("3. Move user to a tenant")
+    print("4. Move application to a tenant")
+    action = infinite_input_int("> ", 1, 4)
+    if action == 1:
+        tenants = asyncio.run(database.get_tenants())
+        if not tenants:
+            print(f"Only the {DEFAULT_TENANT} tenant without quotas")
+        for name, max_bundles, max_requests_per_second in tenants:
+            print(f"{name} - applications: {max_bundles or 'unlimited'}, "
+                  f"requests per second: {max_requests_per_second or 'unlimited'}")
+    elif action == 2:
+        name = infinite_input_str("Tenant> ")
+        max_bundles = infinite_input_int("Maximum applications, 0 for unlimited> ", 0, 2 ** 31 - 1)
+        max_requests_per_second = infinite_input_int("Maximum requests per second, 0 for unlimited> ", 0, 2 ** 31 - 1)
+        asyncio.run(database.set_tenant(name, max_bundles or None, max_requests_per_second or None))
+        publish_tenants_changed()
+    elif action == 4:
+        move_bundle()
+    else:
+        usernames = asyncio.run(database.get_usernames())
+        for username_idx in range(len(usernames)):
+            print(f"{username_idx + 1}. {usernames[username_idx]}")
+        user_id = infinite_input_int("User number> ", 1, len(usernames))
+        tenant = infinite_input_str("Tenant> ")
+        asyncio.run(database.set_user_tenant(usernames[user_id - 1], tenant))
+        invalidate_user_sessions(usernames[user_id - 1])
+        publish_tenants_changed()
+        print("The user has to log in again")
+
+
+def move_bundle():
+    from utils.audit_log import MOVE_BUNDLE
+
+    database = get_database()
+    bundle_id = infinite_input_str("Application id> ")
+    tenant = infinite_input_str("Tenant> ")
+    previous_tenant = asyncio.run(database.move_bundle(bundle_id, tenant))
+    if previous_tenant is None:
+        print("The application does not exist")
+        return
+    record_audit(MOVE_BUNDLE, bundle_id, f"from {previous_tenant}", tenant=tenant)
+    if ALLOWANCE_STORE == "redis":
+        from redis.asyncio import Redis
+        from utils.allowance_store import RedisAllowanceStore
+
+        async def forget_allowance():
+            redis = Redis.from_url(REDIS_CONNECTION_STRING)
+            try:
+                await RedisAllowanceStore(redis).on_bundles_changed([bundle_id], None)
+            finally:
+                await redis.aclose()
+
+        try:
+            asyncio.run(forget_allowance())
+        except Exception:  # noqa
+            print("Failed to update the allowance store, the reconciler moves the application on its next run")
+    publish_tenants_changed()
+    if not publish_invalidation("bundles", [bundle_id]):
+        print("Failed to notify the agents, they move the application on their next full reload")
+    print(f"The application moved from {previous_tenant} to {tenant}")
 
 
 def main():
@@ -81,9 +299,12 @@ def main():
         print("1. Add user")
         print("2. Change user password")
         print("3. Delete user")
-        print("4. Exit")
-        action = infinite_input_int("> ", 1, 4)
-        actions = [add_user, reset_user_pass, remove_user, exit]
+        print("4. Clean up stale applications")
+        print("5. Audit log")
+        print("6. Tenants")
+        print("7. Exit")
+        action = infinite_input_int("> ", 1, 7)
+        actions = [add_user, reset_user_pass, remove_user, reap_stale_bundles, show_audit_log, manage_tenants, exit]
         actions[action - 1]()
 
 
@@ -15,6 +15,9 @@ LOADING_BUNDLE_PROMPT = "Loading application profile"
 BUNDLE_NOT_FOUND_PROMPT = "Application not found"
 BUNDLES_LIST_BUTTON = "Application list"
 LOGOUT_BUTTON = "Logout"
+NEW_BUNDLES_NOTIFICATIONS_BUTTON = "🔔 New apps notifications"
+BUNDLE_RULES_BUTTON = "🛡 Rules for unknown apps"
+AUDIT_LOG_BUTTON = "📜 Audit log"
 
 ACCESS_DENIED_PLEASE_RELOGIN_PROMPT_INLINE = "Unauthorized. To authorize, type /start"
 ONLY_CHAT_WITH_BOT_SUPPORT = "Supported only in chat with bot"
@@ -25,8 +28,68 @@ EDIT_TEXT_TRIGGER = "Edit "
 BUNDLE_SWITCH_ALLOW_BUTTON = "✅ Allow launch"
 BUNDLE_SWITCH_DENY_BUTTON = "❌ Prohibit launch"
 BUNDLE_REMOVE_BUTTON = "🗑 Remove"
+BUNDLE_ACTIVITY_BUTTON = "📈 Activity"
+BUNDLE_AUDIT_BUTTON = "📜 History"
+BUNDLE_SCHEDULES_BUTTON = "🕒 Schedule"
+BLOCK_FOR_HOURS_BUTTON = "❌ {hours} h"
+ADD_ALLOW_WINDOW_BUTTON = "✅ Allow only during hours"
+ADD_DENY_WINDOW_BUTTON = "❌ Block during hours"
+REMOVE_SCHEDULE_BUTTON = "🗑 {schedule}"
+TO_BUNDLE_BUTTON = "↩️  Back to application"
 TO_BUNDLES_LIST = "↩️  Back to application list"
 
 IS_NO_PAGE_ALERT = "There are no more pages"
 
+NEW_BUNDLES_SUBSCRIBED_PROMPT = "🔔 You will receive digests of new applications"
+NEW_BUNDLES_UNSUBSCRIBED_PROMPT = "🔕 You will no longer receive digests of new applications"
+NEW_BUNDLES_DIGEST = "🆕 {count} new apps in the last {minutes} minutes:\n{bundles}"
+NEW_BUNDLES_DIGEST_MORE = "...and {count} more"
+NEW_BUNDLE_BLOCK_BUTTON = "❌ Block {bundle}"
+NEW_BUNDLE_BLOCKED_ALERT = "❌ Launch prohibited: {bundle}"
+BUNDLE_BUTTON_EXPIRED_ALERT = "This message is too old, find the application in the list"
+BUNDLE_RULES_PROMPT = (
+    "Rules for unknown applications\n"
+    "Default policy: {policy}\n\n"
+    "Allow:\n{allow}\n\n"
+    "Deny:\n{deny}"
+)
+NO_BUNDLE_RULES = "—"
+DEFAULT_POLICY_ALLOW = "✅ create and allow"
+DEFAULT_POLICY_DENY = "❌ block, do not create"
+SWITCH_DEFAULT_POLICY_BUTTON = "🔁 Switch default policy"
+ADD_ALLOW_RULE_BUTTON = "➕ Allow rule"
+ADD_DENY_RULE_BUTTON = "➕ Deny rule"
+REMOVE_BUNDLE_RULE_BUTTON = "🗑 {action}: {pattern}"
+ENTER_RULE_PATTERN_PROMPT = (
+    "Enter pattern in one of the formats:\n"
+    "prefix:com.example.\n"
+    "glob:com.*.app\n"
+    "re:^com\\.example\\..+$"
+)
+INVALID_RULE_PATTERN_PROMPT = "Invalid pattern: {error}"
+BUNDLE_ACTIVITY_PROMPT = (
+    "Activity of {bundle_name}\n"
+    "Last hour: {last_hour}\n"
+    "Last 24 hours: {last_day}\n"
+    "Last 7 days: {last_week}\n\n"
+    "By hour:\n{hourly}"
+)
+BUNDLE_ACTIVITY_HOUR = "{hour} — {count}"
+MAINTENANCE_REPORT = "🧹 Maintenance finished\n{stale}\nDatabase optimized, took {seconds} s"
+STALE_BUNDLES_ARCHIVED = "Archived {count} apps without checks for {days} days"
+STALE_BUNDLES_DELETED = "Deleted {count} apps without checks for {days} days"
+AUDIT_LOG_PROMPT = "📜 Audit log{scope}, latest first:\n\n{entries}"
+AUDIT_LOG_OF_BUNDLE = " of {bundle}"
+AUDIT_LOG_OF_USER = " of user {user}"
+AUDIT_LOG_ENTRY = "{time} — {actor}: {action}"
+NO_AUDIT_EVENTS = "No recorded actions"
+BUNDLE_SCHEDULES_PROMPT = "🕒 Schedule of {bundle_name}, time in {timezone}:\n{schedules}\n\nBlock for:"
+NO_BUNDLE_SCHEDULES = "No scheduled changes"
+SCHEDULE_ALLOWED = "✅ allowed"
+SCHEDULE_BLOCKED = "❌ blocked"
+TIMEBOX_SCHEDULE = "{status} until {until}"
+WINDOW_SCHEDULE = "{status} {start}–{end}, {other_status} otherwise"
+ENTER_SCHEDULE_WINDOW_PROMPT = "Enter hours in {timezone} as HH:MM-HH:MM, e.g. 09:00-18:00"
+INVALID_SCHEDULE_WINDOW_PROMPT = "Invalid hours, expected HH:MM-HH:MM with different start and end"
+
 ACCESS_DENIED_PLEASE_RELOGIN_PROMPT = "You are not authorized"
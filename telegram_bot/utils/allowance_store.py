@@ -0,0 +1,173 @@
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+
+from telegram_bot.config import (
+    ALLOWANCE_KEY,
+    ALLOWANCE_PINGS_KEY,
+    ALLOWANCE_RECONCILE_LOCK_KEY,
+    ALLOWANCE_RECONCILE_INTERVAL_SECONDS
+)
+from utils.database_connector import DatabaseConnector
+
+
+# Fields of the allowance hash are "1" or "0" followed by the tenant of the application.
+
+# Returns the allowance and records the ping only for applications the store knows in the tenant of the check.
+CHECK_SCRIPT = """
+local value = redis.call('HGET', KEYS[1], ARGV[1])
+if value and string.sub(value, 2) == ARGV[3] then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    return string.sub(value, 1, 1)
+end
+return false
+"""
+
+# Changes the allowance of known applications, keeping their tenant.
+CHANGE_SCRIPT = """
+for i = 2, #ARGV do
+    local value = redis.call('HGET', KEYS[1], ARGV[i])
+    if value then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[1] .. string.sub(value, 2))
+    end
+end
+"""
+
+# Sets or removes (empty value) fields given as id, expected, value triples, but only if the field
+# still has the expected value (empty if missing), so a newer change made by a listener is never overwritten.
+COMPARE_AND_SET_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    if (redis.call('HGET', KEYS[1], ARGV[i]) or '') == ARGV[i + 1] then
+        if ARGV[i + 2] == '' then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        else
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        end
+    end
+end
+"""
+
+
+class RedisAllowanceStore:
+    """
+    Class that keeps launch allowance of applications in a Redis hash shared by all agent replicas.
+    Ping times are collected in a second hash and written to the database by the reconciler,
+    which runs on one replica at a time.
+    """
+    chunk_size = 1000
+
+    def __init__(
+            self,
+            redis: Redis,
+            allowance_key: str = ALLOWANCE_KEY,
+            pings_key: str = ALLOWANCE_PINGS_KEY,
+            lock_key: str = ALLOWANCE_RECONCILE_LOCK_KEY
+    ):
+        self.redis = redis
+        self.allowance_key = allowance_key
+        self.pings_key = pings_key
+        self.lock_key = lock_key
+        self.check_script = redis.register_script(CHECK_SCRIPT)
+        self.change_script = redis.register_script(CHANGE_SCRIPT)
+        self.compare_and_set_script = redis.register_script(COMPARE_AND_SET_SCRIPT)
+        self.task: asyncio.Task | None = None
+
+    async def check(self, bundle_id: str, ping_time: int, tenant: str) -> bool | None:
+        """
+        Get launch allowance and record the ping in one round trip.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            ping_time (int): Timestamp of the check.
+            tenant (str): Tenant of the check.
+        Returns:
+            bool | None: Launch allowance, or None if the application is not in the store for the tenant.
+        """
+        allowance = await self.check_script(
+            keys=[self.allowance_key, self.pings_key],
+            args=[bundle_id, ping_time, tenant]
+        )
+        return None if allowance is None else allowance == b"1"
+
+    async def set(self, bundle_id: str, allowance: bool, tenant: str) -> None:
+        """
+        Store launch allowance of an application checked in the database.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            allowance (bool): Launch allowance.
+            tenant (str): Tenant the application belongs to.
+        """
+        await self.redis.hset(self.allowance_key, bundle_id, f"{'1' if allowance else '0'}{tenant}")
+
+    async def on_bundles_changed(self, bundle_ids: list[str], execution_status: bool | None) -> None:
+        """
+        Apply launch allowance change or removal of applications. Used as DatabaseConnector change listener.
+        Applications missing from the store are left to the agent and the reconciler, which know their tenant.
+        Args:
+            bundle_ids (list[str]): Application identifiers.
+            execution_status (bool | None): New launch allowance, or None if the applications were removed.
+        """
+        if not bundle_ids:
+            return
+        if execution_status is None:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hdel(self.allowance_key, *bundle_ids)
+                pipe.hdel(self.pings_key, *bundle_ids)
+                await pipe.execute()
+        else:
+            await self.change_script(keys=[self.allowance_key], args=["1" if execution_status else "0", *bundle_ids])
+
+    async def reconcile(self, db: DatabaseConnector) -> bool:
+        """
+        Write collected ping times to the database and bring the allowance hash in line with the database,
+        if no other replica has done it during the last interval. Only differing fields are written,
+        and only if they were not changed since they were read.
+        Args:
+            db (DatabaseConnector): Database connector.
+        Returns:
+            bool: True if this replica reconciled.
+        """
+        if not await self.redis.set(self.lock_key, 1, nx=True, ex=max(1, ALLOWANCE_RECONCILE_INTERVAL_SECONDS - 1)):
+            return False
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.pings_key)
+            pipe.delete(self.pings_key)
+            pings, _ = await pipe.execute()
+        await db.set_last_access_times({bundle_id.decode(): int(ping_time) for bundle_id, ping_time in pings.items()})
+
+        cached = {
+            bundle_id.decode(): value.decode()
+            for bundle_id, value in (await self.redis.hgetall(self.allowance_key)).items()
+        }
+        allowances = {
+            bundle_id: f"{'1' if allow else '0'}{tenant}"
+            for bundle_id, allow, tenant in await db.get_allowances()
+        }
+        changes = [
+            (bundle_id, cached.get(bundle_id, ""), value)
+            for bundle_id, value in allowances.items() if cached.get(bundle_id) != value
+        ]
+        changes += [(bundle_id, value, "") for bundle_id, value in cached.items() if bundle_id not in allowances]
+        for i in range(0, len(changes), self.chunk_size):
+            args = [field for change in changes[i:i + self.chunk_size] for field in change]
+            await self.compare_and_set_script(keys=[self.allowance_key], args=args)
+        return True
+
+    async def start(self, db: DatabaseConnector) -> None:
+        await self.reconcile(db)
+        self.task = asyncio.create_task(self.__run(db))
+
+    async def stop(self, db: DatabaseConnector) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.reconcile(db)
+
+    async def __run(self, db: DatabaseConnector) -> None:
+        while True:
+            await asyncio.sleep(ALLOWANCE_RECONCILE_INTERVAL_SECONDS)
+            try:
+                await self.reconcile(db)
+            except Exception:  # noqa
+                logging.exception("Failed to reconcile allowance store")
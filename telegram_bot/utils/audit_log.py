@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+import time
+
+from telegram_bot.config import AUDIT_LOG_FILE, AUDIT_LOG_FLUSH_SECONDS, DEFAULT_TENANT
+from utils.database_connector import DatabaseConnector
+
+BLOCK_BUNDLE = "block"
+ALLOW_BUNDLE = "allow"
+REMOVE_BUNDLE = "remove"
+SET_DEFAULT_POLICY = "set_default_policy"
+ADD_RULE = "add_rule"
+REMOVE_RULE = "remove_rule"
+ADD_SCHEDULE = "add_schedule"
+REMOVE_SCHEDULE = "remove_schedule"
+REAP_STALE_BUNDLES = "reap_stale"
+CREATE_USER = "create_user"
+CHANGE_PASSWORD = "change_password"
+REMOVE_USER = "remove_user"
+MOVE_BUNDLE = "move_bundle"
+
+MAINTENANCE_ACTOR = "maintenance"
+
+
+class AuditLog:
+    """
+    Class that records admin actions in the append-only audit_log table and optionally a JSONL file.
+    record() only enqueues the event; a background task writes events in batches,
+    so recording never delays the handler.
+    """
+    batch_size = 500
+    retry_seconds = 5
+
+    def __init__(self, db: DatabaseConnector, path: str = AUDIT_LOG_FILE, flush_interval: int = AUDIT_LOG_FLUSH_SECONDS):
+        self.db = db
+        self.path = path
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue[dict] = asyncio.Queue()
+        self.failed: list[dict] = []
+        self.task: asyncio.Task | None = None
+
+    def record(
+            self,
+            actor: str,
+            action: str,
+            bundle_id: str = None,
+            details: str = None,
+            tenant: str = DEFAULT_TENANT
+    ) -> None:
+        """
+        Enqueue audit event. Never blocks.
+        Args:
+            actor (str): Who made the action, e.g. bot login or manage.py.
+            action (str): One of the action constants of this module.
+            bundle_id (str): Application identifier e.g. com.example.app, if the action is about an application.
+            details (str): Free-form details, e.g. rule pattern.
+            tenant (str): Tenant the action belongs to.
+        """
+        self.queue.put_nowait({
+            "created_at": int(time.time()),
+            "actor": actor or "unknown",
+            "action": action,
+            "bundle_id": bundle_id,
+            "details": details,
+            "tenant": tenant
+        })
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    async def flush(self) -> bool:
+        """
+        Write all queued events now.
+        Returns:
+            bool: True if the events were written, otherwise they are kept for the next attempt.
+        """
+        events, self.failed = self.failed, []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return await self.__write(events)
+
+    async def __run(self) -> None:
+        while True:
+            events, self.failed = self.failed, []
+            if not events:
+                events.append(await self.queue.get())
+                await asyncio.sleep(self.flush_interval)
+            while not self.queue.empty() and len(events) < self.batch_size:
+                events.append(self.queue.get_nowait())
+            if not await self.__write(events):
+                await asyncio.sleep(self.retry_seconds)
+
+    async def __write(self, events: list[dict]) -> bool:
+        if not events:
+            return True
+        try:
+            await self.db.add_audit_events(events)
+        except Exception:  # noqa
+            logging.exception("Failed to write %d audit events", len(events))
+            self.failed = events + self.failed
+            return False
+        if self.path:
+            try:
+                await asyncio.to_thread(self.__append_to_file, events)
+            except OSError:
+                logging.exception("Failed to append %d audit events to %s", len(events), self.path)
+        return True
+
+    def __append_to_file(self, events: list[dict]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
@@ -2,8 +2,52 @@ import time
 from os import getenv
 
 import jwt
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from config import USER_EPOCH_KEY_PREFIX, USER_TENANT_CHECK_SECONDS
 from strings import ACCESS_DENIED_PLEASE_RELOGIN_PROMPT
+from utils.database_connector import DatabaseConnector
+
+auth_database: DatabaseConnector | None = None
+auth_redis: Redis | None = None
+
+
+def init_auth(database: DatabaseConnector, redis: Redis) -> None:
+    """
+    Give check_auth the database connector and Redis client of the bot. Must be called before polling starts.
+    """
+    global auth_database, auth_redis
+    auth_database = database
+    auth_redis = redis
+
+
+async def is_user_tenant_current(data: dict, state: FSMContext) -> bool:
+    """
+    Check that the user of the session still exists and belongs to the tenant of the session.
+    The answer of the database is kept in the session until manage.py changes the user
+    (which increments the user epoch in Redis) or for USER_TENANT_CHECK_SECONDS.
+    Args:
+        data (dict): Session data.
+        state (FSMContext): Session.
+    Returns:
+        bool: True if the user may keep working in the session tenant.
+    """
+    login = data.get("login")
+    try:
+        epoch = int(await auth_redis.get(f"{USER_EPOCH_KEY_PREFIX}:{login}") or 0)
+    except RedisError:
+        epoch = None
+    checked = data.get("tenant_check")
+    if epoch is not None and checked is not None and checked[:2] == [login, epoch] \
+            and checked[2] > time.time() - USER_TENANT_CHECK_SECONDS:
+        return True
+    if data["tenant"] != await auth_database.get_user_tenant(login):
+        return False
+    if epoch is not None:
+        await state.update_data(tenant_check=[login, epoch, int(time.time())])
+    return True
 
 
 def check_auth(on_auth_fail):
@@ -26,6 +70,11 @@ def check_auth(on_auth_fail):
                     jwt_data = jwt.decode(data["jwt_key"], key=getenv("JWT_KEY"), algorithms="HS256")
                     if jwt_data["valid_until"] < time.time():
                         await alert_user_access_denied(message, state)
+                    elif data.get("tenant") is None or jwt_data.get("tenant") != data["tenant"]:
+                        await alert_user_access_denied(message, state)
+                    elif not await is_user_tenant_current(data, state):
+                        # The user was moved to another tenant or removed since logging in
+                        await alert_user_access_denied(message, state)
                     else:
                         await func(message, state)
             except Exception:  # noqa
@@ -0,0 +1,47 @@
+import hashlib
+
+from redis.asyncio import Redis
+
+from telegram_bot.config import BUNDLE_BUTTON_KEY_PREFIX, BUNDLE_BUTTON_TTL_SECONDS
+
+
+def button_key(bundle_id: str) -> str:
+    """
+    Get short key of an application for callback data, which Telegram limits to 64 bytes.
+    """
+    return hashlib.blake2b(bundle_id.encode(), digest_size=8).hexdigest()
+
+
+class BundleButtons:
+    """
+    Class that keeps application ids of inline buttons in Redis.
+    Buttons carry button_key() of the application instead of its id, which may be too long for callback data;
+    ids have to be remembered before the buttons are sent and are kept for BUNDLE_BUTTON_TTL_SECONDS.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def remember(self, bundle_ids: list[str]) -> None:
+        """
+        Store application ids of buttons about to be sent, or refresh them.
+        Args:
+            bundle_ids (list[str]): Application identifiers.
+        """
+        if not bundle_ids:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for bundle_id in bundle_ids:
+                pipe.set(f"{BUNDLE_BUTTON_KEY_PREFIX}:{button_key(bundle_id)}", bundle_id, ex=BUNDLE_BUTTON_TTL_SECONDS)
+            await pipe.execute()
+
+    async def resolve(self, key: str) -> str | None:
+        """
+        Get application id of a button.
+        Args:
+            key (str): Key from the button callback data.
+        Returns:
+            str | None: Application identifier, or None if the message is older than BUNDLE_BUTTON_TTL_SECONDS.
+        """
+        bundle_id = await self.redis.get(f"{BUNDLE_BUTTON_KEY_PREFIX}:{key}")
+        return bundle_id.decode() if bundle_id is not None else None
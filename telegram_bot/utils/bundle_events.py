@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from telegram_bot.config import NEW_BUNDLES_STREAM, NEW_BUNDLES_STREAM_MAX_LEN, DEFAULT_TENANT
+
+
+class NewBundlesPublisher:
+    """
+    Class that publishes "new bundle" events to a Redis stream.
+    Events are buffered in memory and written by a background task in pipelined batches,
+    so the verify request never waits for Redis.
+    """
+    batch_size = 500
+    queue_size = 10000
+
+    def __init__(self, redis: Redis, stream: str = NEW_BUNDLES_STREAM):
+        self.redis = redis
+        self.stream = stream
+        self.queue: asyncio.Queue[tuple[str, int, str]] = asyncio.Queue(maxsize=self.queue_size)
+        self.task: asyncio.Task | None = None
+
+    def publish(self, bundle_id: str, seen_at: int, tenant: str = DEFAULT_TENANT) -> None:
+        """
+        Enqueue "new bundle" event. Never blocks; the event is dropped if the queue is full.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            seen_at (int): Timestamp of the first request from the application.
+            tenant (str): Tenant the application was created in.
+        """
+        try:
+            self.queue.put_nowait((bundle_id, seen_at, tenant))
+        except asyncio.QueueFull:
+            logging.warning("New bundles queue is full, event for %s dropped", bundle_id)
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        if events:
+            await self.__write(events)
+
+    async def __run(self) -> None:
+        while True:
+            events = [await self.queue.get()]
+            while not self.queue.empty() and len(events) < self.batch_size:
+                events.append(self.queue.get_nowait())
+            await self.__write(events)
+
+    async def __write(self, events: list[tuple[str, int, str]]) -> None:
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for bundle_id, seen_at, tenant in events:
+                    pipe.xadd(
+                        self.stream,
+                        {"bundle_id": bundle_id, "seen_at": seen_at, "tenant": tenant},
+                        maxlen=NEW_BUNDLES_STREAM_MAX_LEN,
+                        approximate=True
+                    )
+                await pipe.execute()
+        except RedisError:
+            logging.exception("Failed to publish %d new bundle events", len(events))
@@ -0,0 +1,181 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+
+class BundleRegistry:
+    """
+    Class that keeps launch allowance of applications in process memory.
+    Records are slots in parallel arrays, application ids and tenants are interned strings,
+    and the whole registry is saved to and loaded from a compact snapshot file.
+
+    Snapshot layout (little-endian):
+        header         - magic and number of records
+        allowed        - 1 byte per record
+        last_access    - int64 per record
+        bundle_ids     - utf-8 ids separated by NUL
+        tenants        - NUL, then utf-8 tenants separated by NUL
+    """
+    __slots__ = ("index", "bundle_ids", "tenants", "allowed", "last_access", "free_slots")
+
+    magic = b"BREG2\n"
+    header = struct.Struct("<6sI")
+
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.bundle_ids: list[str | None] = []
+        self.tenants: list[str | None] = []
+        self.allowed = bytearray()
+        self.last_access = array("q")
+        self.free_slots: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, bundle_id: str) -> bool | None:
+        """
+        Get launch allowance.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+        Returns:
+            bool | None: Launch allowance, or None if the application is not registered.
+        """
+        slot = self.index.get(bundle_id)
+        return None if slot is None else self.allowed[slot] == 1
+
+    def touch(self, bundle_id: str, ping_time: int, tenant: str) -> bool | None:
+        """
+        Get launch allowance and update the last check time.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            ping_time (int): Timestamp of the check.
+            tenant (str): Tenant of the check.
+        Returns:
+            bool | None: Launch allowance, or None if the application is not registered in the tenant.
+        """
+        slot = self.index.get(bundle_id)
+        if slot is None or self.tenants[slot] != tenant:
+            return None
+        self.last_access[slot] = ping_time
+        return self.allowed[slot] == 1
+
+    def set(self, bundle_id: str, allowed: bool, last_access: int, tenant: str) -> None:
+        """
+        Register application or update its launch allowance.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            allowed (bool): Launch allowance.
+            last_access (int): Last check timestamp, kept as is for registered applications if 0.
+            tenant (str): Tenant the application belongs to.
+        """
+        slot = self.index.get(bundle_id)
+        tenant = sys.intern(tenant)
+        if slot is None:
+            bundle_id = sys.intern(bundle_id)
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.bundle_ids[slot] = bundle_id
+                self.tenants[slot] = tenant
+                self.allowed[slot] = allowed
+                self.last_access[slot] = last_access
+            else:
+                slot = len(self.bundle_ids)
+                self.bundle_ids.append(bundle_id)
+                self.tenants.append(tenant)
+                self.allowed.append(allowed)
+                self.last_access.append(last_access)
+            self.index[bundle_id] = slot
+        else:
+            self.tenants[slot] = tenant
+            self.allowed[slot] = allowed
+            if last_access:
+                self.last_access[slot] = last_access
+
+    def remove(self, bundle_id: str) -> None:
+        """
+        Unregister application.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+        """
+        slot = self.index.pop(bundle_id, None)
+        if slot is not None:
+            self.bundle_ids[slot] = None
+            self.tenants[slot] = None
+            self.free_slots.append(slot)
+
+    def replace(self, rows: list[list[str, bool, int]]) -> None:
+        """
+        Replace all records.
+        Args:
+            rows (list[list[str, bool, int, str]]): Application id, launch allowance, last check time and tenant.
+        """
+        self.bundle_ids = [sys.intern(row[0]) for row in rows]
+        self.tenants = [sys.intern(row[3]) for row in rows]
+        self.index = {bundle_id: slot for slot, bundle_id in enumerate(self.bundle_ids)}
+        self.allowed = bytearray(bool(row[1]) for row in rows)
+        self.last_access = array("q", (row[2] or 0 for row in rows))
+        self.free_slots = []
+
+    def save(self, path: str) -> None:
+        """
+        Atomically write snapshot.
+        Args:
+            path (str): Snapshot file path.
+        """
+        slots = list(self.index.values())
+        allowed = bytes(self.allowed[slot] for slot in slots)
+        last_access = array("q", (self.last_access[slot] for slot in slots))
+        if sys.byteorder != "little":
+            last_access.byteswap()
+        bundle_ids = "\0".join(self.bundle_ids[slot] for slot in slots).encode()
+        tenants = "\0".join(self.tenants[slot] for slot in slots).encode()
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.header.pack(self.magic, len(slots)))
+            f.write(allowed)
+            f.write(last_access.tobytes())
+            f.write(bundle_ids)
+            f.write(b"\0\0")
+            f.write(tenants)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BundleRegistry":
+        """
+        Read snapshot, memory-mapping the file.
+        Args:
+            path (str): Snapshot file path.
+        Returns:
+            BundleRegistry: Loaded registry. Empty if the file is missing or invalid.
+        """
+        registry = cls()
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, count = cls.header.unpack_from(data, 0)
+                if magic != cls.magic:
+                    return registry
+                offset = cls.header.size
+                allowed = bytearray(data[offset:offset + count])
+                offset += count
+                last_access = array("q")
+                last_access.frombytes(data[offset:offset + count * last_access.itemsize])
+                offset += count * last_access.itemsize
+                bundle_ids, _, tenants = data[offset:].decode().partition("\0\0")
+                bundle_ids = [sys.intern(bundle_id) for bundle_id in bundle_ids.split("\0")] if count else []
+                tenants = [sys.intern(tenant) for tenant in tenants.split("\0")] if count else []
+        except (OSError, ValueError, struct.error, UnicodeDecodeError):
+            return registry
+
+        if any(len(column) != count for column in (allowed, last_access, bundle_ids, tenants)):
+            return registry
+        if sys.byteorder != "little":
+            last_access.byteswap()
+        registry.bundle_ids = bundle_ids
+        registry.tenants = tenants
+        registry.index = {bundle_id: slot for slot, bundle_id in enumerate(bundle_ids)}
+        registry.allowed = allowed
+        registry.last_access = last_access
+        return registry
@@ -0,0 +1,120 @@
+import fnmatch
+import logging
+import re
+
+from telegram_bot.config import APP_ID_MAX_LENGTH, APP_ID_CHARSET, DEFAULT_TENANT
+
+ALLOW_POLICY = "allow"
+DENY_POLICY = "deny"
+DEFAULT_POLICY_SETTING = "default_bundle_policy"
+
+
+def default_policy_setting(tenant: str) -> str:
+    """
+    Get settings key of the default policy of a tenant. The default tenant keeps the original key.
+    """
+    return DEFAULT_POLICY_SETTING if tenant == DEFAULT_TENANT else f"{DEFAULT_POLICY_SETTING}:{tenant}"
+
+
+class BundleRules:
+    """
+    Class that evaluates compiled allow/deny rules in memory for application identifiers
+    the agent does not know yet, before the database is touched. Known applications are
+    answered by their launch allowance, whatever the rules say.
+
+    Pattern formats:
+        prefix:com.example.  - identifier starts with the string
+        glob:com.*.app       - shell-style wildcard match of the whole identifier
+        re:^com\\.example\\. - regular expression search
+    """
+    REJECT = 0
+    KNOWN_ONLY = 1
+    ALLOW = 2
+
+    def __init__(self, default_allow: bool = True, allow: list[str] = (), deny: list[str] = ()):
+        self.default_allow = default_allow
+        self.__charset = re.compile(APP_ID_CHARSET)
+        self.__allow = self.__compile(allow)
+        self.__deny = self.__compile(deny)
+
+    @classmethod
+    def from_rows(cls, default_policy: str, rows: list[list[int, str, str]]) -> "BundleRules":
+        """
+        Build rules from database rows.
+        Args:
+            default_policy (str): "allow" or "deny".
+            rows (list[list[int, str, str]]): rule id, action ("allow" or "deny") and pattern.
+        Returns:
+            BundleRules: compiled rules.
+        """
+        allow, deny = [], []
+        for _, action, pattern in rows:
+            try:
+                cls.validate_pattern(pattern)
+            except ValueError:
+                logging.exception("Skipping invalid bundle rule %r", pattern)
+                continue
+            (allow if action == ALLOW_POLICY else deny).append(pattern)
+        return cls(default_policy == ALLOW_POLICY, allow, deny)
+
+    @staticmethod
+    def validate_pattern(pattern: str) -> None:
+        """
+        Check that the pattern has a known format and compiles.
+        Args:
+            pattern (str): Rule pattern e.g. prefix:com.example.
+        Raises:
+            ValueError: Pattern is invalid.
+        """
+        kind, _, value = pattern.partition(":")
+        if kind not in ("prefix", "glob", "re") or not value:
+            raise ValueError("pattern must start with prefix:, glob: or re:")
+        if kind == "re":
+            if re.search(r"\(\?[aiLmsux]+\)", value):
+                raise ValueError("global inline flags are not supported, use a scoped group e.g. (?i:...)")
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise ValueError(str(e)) from e
+
+    @staticmethod
+    def __compile(patterns: list[str]) -> tuple[tuple[str, ...], tuple[re.Pattern, ...]]:
+        """
+        Prefixes are checked with one startswith call. Expressions are compiled one by one,
+        so groups, backreferences and flags of a rule cannot affect other rules.
+        """
+        prefixes, expressions = [], []
+        for pattern in patterns:
+            kind, _, value = pattern.partition(":")
+            if kind == "prefix":
+                prefixes.append(value)
+            elif kind == "glob":
+                expressions.append(re.compile(f"^{fnmatch.translate(value)}"))
+            else:
+                expressions.append(re.compile(value))
+        return tuple(prefixes), tuple(expressions)
+
+    @staticmethod
+    def __matches(bundle_id: str, compiled: tuple[tuple[str, ...], tuple[re.Pattern, ...]]) -> bool:
+        prefixes, expressions = compiled
+        if prefixes and bundle_id.startswith(prefixes):
+            return True
+        return any(expression.search(bundle_id) is not None for expression in expressions)
+
+    def check(self, bundle_id: str) -> int:
+        """
+        Evaluate rules for an application identifier that is not in the bundle registry.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+        Returns:
+            int: REJECT - block without touching the database,
+                KNOWN_ONLY - answer only for existing applications, never create new ones,
+                ALLOW - check the application and create it if missing.
+        """
+        if len(bundle_id) > APP_ID_MAX_LENGTH or self.__charset.fullmatch(bundle_id) is None:
+            return self.REJECT
+        if self.__matches(bundle_id, self.__deny):
+            return self.REJECT
+        if self.default_allow or self.__matches(bundle_id, self.__allow):
+            return self.ALLOW
+        return self.KNOWN_ONLY
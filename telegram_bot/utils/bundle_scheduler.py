@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, time as day_time, timedelta
+
+from pytz import timezone
+
+from telegram_bot.config import TIMEZONE
+from utils.database_connector import DatabaseConnector
+
+TIMEBOX = "timebox"
+WINDOW = "window"
+
+
+class BundleScheduler:
+    """
+    Class that applies scheduled launch allowance changes: time-boxed ("block for 2 hours")
+    and daily windows ("allow from 09:00 to 18:00" in TIMEZONE).
+    Schedules are kept in a heap ordered by the next transition, so one task sleeps until
+    the nearest transition and every transition costs O(log n). Transitions due together are
+    applied with one UPDATE per launch allowance value, and change listeners of the database
+    connector invalidate verify-side caches.
+    """
+    retry_seconds = 30
+
+    def __init__(self, db: DatabaseConnector, tz: str = TIMEZONE):
+        self.db = db
+        self.tz = timezone(tz)
+        self.heap: list[tuple[int, int]] = []
+        self.schedules: dict[int, tuple[object, int, bool]] = {}
+        self.wakeup = asyncio.Event()
+
+    def window_allowance(self, schedule, at: int) -> bool:
+        """
+        Get launch allowance set by a daily window at the given time.
+        """
+        local = datetime.fromtimestamp(at, tz=self.tz)
+        minute = local.hour * 60 + local.minute
+        if schedule.window_start < schedule.window_end:
+            inside = schedule.window_start <= minute < schedule.window_end
+        else:
+            inside = minute >= schedule.window_start or minute < schedule.window_end
+        return schedule.allow if inside else not schedule.allow
+
+    def next_transition(self, schedule, after: int) -> tuple[int, bool]:
+        """
+        Get the first transition of a schedule later than the given time.
+        Args:
+            schedule: Schedule row.
+            after (int): Timestamp.
+        Returns:
+            int: Transition timestamp.
+
+            bool: Launch allowance set by the transition.
+        """
+        if schedule.kind == TIMEBOX:
+            return schedule.ends_at, schedule.restore
+
+        today = datetime.fromtimestamp(after, tz=self.tz).date()
+        candidates = []
+        for days in range(3):
+            day = today + timedelta(days=days)
+            for minute, allow in ((schedule.window_start, schedule.allow), (schedule.window_end, not schedule.allow)):
+                at = int(self.tz.localize(datetime.combine(day, day_time(minute // 60, minute % 60))).timestamp())
+                if at > after:
+                    candidates.append((at, allow))
+        return min(candidates)
+
+    async def load(self) -> None:
+        """
+        Read all schedules, rebuild the heap and apply the current state of daily windows,
+        so transitions missed while the bot was down are caught up.
+        """
+        schedules = await self.db.get_schedules()
+        now = int(time.time())
+        self.heap = []
+        self.schedules = {}
+        current = {True: [], False: []}
+        for schedule in schedules:
+            self.__push(schedule, now)
+            if schedule.kind == WINDOW:
+                current[self.window_allowance(schedule, now)].append(schedule.bundle_id)
+        for allow, bundle_ids in current.items():
+            if bundle_ids:
+                await self.db.change_execution_for_bundles(bundle_ids, allow)
+
+    async def add(self, schedule_id: int) -> None:
+        """
+        Apply the current state of a new schedule and start tracking it.
+        Args:
+            schedule_id (int): Id of a schedule stored with DatabaseConnector.add_schedule.
+        """
+        schedules = await self.db.get_schedules(schedule_ids=[schedule_id])
+        if not schedules:
+            return
+        schedule = schedules[0]
+        now = int(time.time())
+        allow = schedule.allow if schedule.kind == TIMEBOX else self.window_allowance(schedule, now)
+        await self.db.change_execution_for_bundles([schedule.bundle_id], allow)
+        self.__push(schedule, now)
+        self.wakeup.set()
+
+    async def remove(self, schedule_id: int) -> None:
+        """
+        Stop and remove a schedule. A time-boxed change is ended at once.
+        Args:
+            schedule_id (int): Schedule id.
+        """
+        entry = self.schedules.pop(schedule_id, None)
+        await self.db.remove_schedules([schedule_id])
+        if entry is not None and entry[0].kind == TIMEBOX:
+            await self.db.change_execution_for_bundles([entry[0].bundle_id], entry[0].restore)
+
+    async def apply_due(self, now: int) -> None:
+        """
+        Apply all transitions due by the given time.
+        Args:
+            now (int): Timestamp.
+        """
+        transitions = {True: {}, False: {}}
+        finished = set()
+        while self.heap and self.heap[0][0] <= now:
+            due_at, schedule_id = heapq.heappop(self.heap)
+            entry = self.schedules.get(schedule_id)
+            if entry is None or entry[1] != due_at:
+                continue
+            schedule, _, allow = entry
+            transitions[allow].setdefault(schedule.bundle_id, []).append(schedule_id)
+            if schedule.kind == TIMEBOX:
+                del self.schedules[schedule_id]
+                finished.add(schedule_id)
+            else:
+                self.__push(schedule, due_at)
+
+        for allow, schedule_ids in transitions.items():
+            if not schedule_ids:
+                continue
+            updated = set(await self.db.change_execution_for_bundles(list(schedule_ids), allow))
+            for bundle_id in schedule_ids.keys() - updated:
+                for schedule_id in schedule_ids[bundle_id]:
+                    self.schedules.pop(schedule_id, None)
+                    finished.add(schedule_id)
+        await self.db.remove_schedules(list(finished))
+
+    async def run(self) -> None:
+        """
+        Apply transitions forever, sleeping until the nearest one or until a schedule is added.
+        After a failure the schedules are reloaded from the database.
+        """
+        needs_load = True
+        while True:
+            if needs_load:
+                try:
+                    await self.load()
+                    needs_load = False
+                except Exception:  # noqa
+                    logging.exception("Failed to load bundle schedules")
+                    await asyncio.sleep(self.retry_seconds)
+                    continue
+
+            self.wakeup.clear()
+            now = time.time()
+            if not self.heap or self.heap[0][0] > now:
+                timeout = self.heap[0][0] - now if self.heap else None
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.apply_due(int(now))
+            except Exception:  # noqa
+                logging.exception("Failed to apply scheduled launch allowance changes")
+                needs_load = True
+                await asyncio.sleep(self.retry_seconds)
+
+    def __push(self, schedule, after: int) -> None:
+        due_at, allow = self.next_transition(schedule, after)
+        self.schedules[schedule.id] = (schedule, due_at, allow)
+        heapq.heappush(self.heap, (due_at, schedule.id))
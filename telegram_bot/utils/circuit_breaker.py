@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from telegram_bot.config import (
+    CIRCUIT_BREAKER_FAILURES,
+    CIRCUIT_BREAKER_RESET_SECONDS,
+    VERIFY_DB_TIMEOUT_SECONDS,
+    VERIFY_DB_MAX_CONCURRENCY
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency that is considered unavailable or saturated.
+    """
+
+
+class CircuitBreaker:
+    """
+    Class that guards calls to a slow or failing dependency.
+    Every call is limited by a timeout and by the number of calls in flight. A call that times out
+    is answered at once and left to finish in the background, because a call blocked in a driver
+    thread (e.g. SQLite waiting for a lock) cannot be cancelled; it counts as in flight until it ends,
+    so abandoned calls are bounded by max_concurrent. Only timeouts and errors of failure_types
+    (unavailable dependency, e.g. connection errors) are failures; other errors are answers of a working
+    dependency and are raised as they are. After a number of consecutive failures the circuit opens and calls are refused at once; after reset_seconds
+    one trial call is let through, and its success closes the circuit again.
+    Time spent open is accumulated for the metrics.
+    """
+
+    def __init__(
+            self,
+            timeout: float = VERIFY_DB_TIMEOUT_SECONDS,
+            failure_threshold: int = CIRCUIT_BREAKER_FAILURES,
+            reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS,
+            max_concurrent: int = VERIFY_DB_MAX_CONCURRENCY,
+            failure_types: tuple[type[BaseException], ...] = (OSError,)
+    ):
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_concurrent = max_concurrent
+        self.failure_types = failure_types
+        self.failures = 0
+        self.in_flight = 0
+        self.opened_at: float | None = None
+        self.trial_at: float | None = None
+        self.trial_running = False
+        self.degraded_seconds = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def degraded_seconds_total(self) -> float:
+        """
+        Get time spent with the circuit open, including the current opening.
+        """
+        if self.opened_at is None:
+            return self.degraded_seconds
+        return self.degraded_seconds + time.monotonic() - self.opened_at
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call the dependency through the breaker.
+        Args:
+            func (Callable[..., Awaitable[Any]]): Coroutine function to call.
+        Returns:
+            Any: Result of the call.
+        Raises:
+            CircuitOpenError: If the circuit is open or too many calls are in flight.
+            asyncio.TimeoutError: If the call did not finish in time, which is counted as a failure.
+            Exception: Error of the call, which is counted as a failure if it is one of failure_types.
+        """
+        trial = False
+        if self.opened_at is not None:
+            if self.trial_running or time.monotonic() < self.trial_at:
+                raise CircuitOpenError()
+            trial = self.trial_running = True
+        elif self.in_flight >= self.max_concurrent:
+            raise CircuitOpenError()
+
+        self.in_flight += 1
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        task.add_done_callback(self.__on_call_done)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.timeout)
+            if not done:
+                self.__on_failure()
+                raise asyncio.TimeoutError()
+            error = task.exception()
+            if isinstance(error, self.failure_types):
+                self.__on_failure()
+            else:
+                self.__on_success()
+            if error is not None:
+                raise error
+            return task.result()
+        finally:
+            if trial:
+                self.trial_running = False
+
+    def __on_call_done(self, task: asyncio.Future) -> None:
+        self.in_flight -= 1
+        if not task.cancelled():
+            task.exception()
+
+    def __on_success(self) -> None:
+        self.failures = 0
+        if self.opened_at is not None:
+            self.degraded_seconds += time.monotonic() - self.opened_at
+            self.opened_at = None
+
+    def __on_failure(self) -> None:
+        self.failures += 1
+        now = time.monotonic()
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self.opened_at = now
+        if self.opened_at is not None:
+            self.trial_at = now + self.reset_seconds
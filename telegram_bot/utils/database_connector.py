@@ -1,9 +1,26 @@
 import asyncio
 import time
+from typing import Awaitable, Callable
 
 from passlib.context import CryptContext
-from sqlalchemy import (update, NullPool, Boolean, func, insert, Table, Column, Integer, String, MetaData, select, delete, desc)
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import (
+    update, NullPool, Boolean, func, insert, Table, Column, Integer, String, MetaData, select, delete, desc, text,
+    bindparam, Index, inspect, and_, literal
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from telegram_bot.config import (
+    PING_MINUTE_RETENTION_SECONDS,
+    PING_HOUR_RETENTION_SECONDS,
+    PING_DAY_RETENTION_SECONDS,
+    MAINTENANCE_BATCH_SIZE,
+    DEFAULT_TENANT
+)
+
+MINUTE = 60
+HOUR = 60 * 60
+DAY = 24 * 60 * 60
 
 
 class DatabaseConnector:
@@ -17,6 +34,7 @@ class DatabaseConnector:
         Column("id", Integer, primary_key=True),
         Column("login", String, nullable=False, unique=True),
         Column("password", String, nullable=False),
+        Column("tenant", String, nullable=False, server_default=DEFAULT_TENANT),
     )
 
     applications = Table(
@@ -25,27 +43,152 @@ class DatabaseConnector:
         Column("id", Integer, primary_key=True),
         Column("bundle_id", String, unique=True),
         Column("allow_execution", Boolean),
-        Column("last_access_time", Integer)
+        Column("last_access_time", Integer),
+        Column("tenant", String, nullable=False, server_default=DEFAULT_TENANT),
+        Index("ix_applications_tenant_bundle_id", "tenant", "bundle_id"),
+        Index("ix_applications_tenant_last_access_time", "tenant", "last_access_time"),
+    )
+
+    bundle_rules = Table(
+        "bundle_rules",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("action", String, nullable=False),
+        Column("pattern", String, nullable=False),
+        Column("tenant", String, nullable=False, server_default=DEFAULT_TENANT, index=True),
+    )
+
+    tenants = Table(
+        "tenants",
+        meta,
+        Column("name", String, primary_key=True),
+        Column("max_bundles", Integer),
+        Column("max_requests_per_second", Integer),
+    )
+
+    settings = Table(
+        "settings",
+        meta,
+        Column("key", String, primary_key=True),
+        Column("value", String, nullable=False),
+    )
+
+    archived_applications = Table(
+        "archived_applications",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("bundle_id", String),
+        Column("allow_execution", Boolean),
+        Column("last_access_time", Integer),
+        Column("archived_at", Integer),
+        Column("tenant", String, nullable=False, server_default=DEFAULT_TENANT)
+    )
+
+    ping_rollups = Table(
+        "ping_rollups",
+        meta,
+        Column("bundle_id", String, primary_key=True),
+        Column("resolution", Integer, primary_key=True),
+        Column("bucket_start", Integer, primary_key=True),
+        Column("count", Integer, nullable=False),
+    )
+
+    audit_log = Table(
+        "audit_log",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("created_at", Integer, nullable=False),
+        Column("actor", String, nullable=False),
+        Column("action", String, nullable=False),
+        Column("bundle_id", String),
+        Column("details", String),
+        Column("tenant", String, nullable=False, server_default=DEFAULT_TENANT),
+        Index("ix_audit_log_created_at", "created_at"),
+        Index("ix_audit_log_bundle_id_created_at", "bundle_id", "created_at"),
+        Index("ix_audit_log_actor_created_at", "actor", "created_at"),
+        Index("ix_audit_log_tenant_created_at", "tenant", "created_at"),
+    )
+
+    bundle_schedules = Table(
+        "bundle_schedules",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("bundle_id", String, nullable=False, index=True),
+        Column("kind", String, nullable=False),
+        Column("allow", Boolean, nullable=False),
+        Column("ends_at", Integer),
+        Column("restore", Boolean),
+        Column("window_start", Integer),
+        Column("window_end", Integer),
     )
 
+    __schema_ready: set[str] = set()
+
     def __init__(self, db_conn_string: str):
-        self.engine = create_async_engine(db_conn_string, poolclass=NullPool)
-        asyncio.run(self.__create_meta())
+        self.db_conn_string = db_conn_string
+        self.__engine: AsyncEngine | None = None
+        self.change_listeners: list[Callable[[list[str], bool | None], Awaitable[None]]] = []
+
+    @property
+    def engine(self) -> AsyncEngine:
+        """
+        Engine is created on first use, so constructing the connector costs nothing.
+        """
+        if self.__engine is None:
+            self.__engine = create_async_engine(self.db_conn_string, poolclass=NullPool)
+        return self.__engine
 
-    async def __create_meta(self):
+    async def ensure_schema(self) -> None:
+        """
+        Create missing tables and columns. Runs once per process for every connection string.
+        """
+        if self.db_conn_string in self.__schema_ready:
+            return
         async with self.engine.begin() as conn:
             await conn.run_sync(self.meta.create_all)
+            await conn.run_sync(self.__add_tenant_columns)
+        self.__schema_ready.add(self.db_conn_string)
 
-    async def create_user(self, login: str, password: str) -> None:
+    @classmethod
+    def __add_tenant_columns(cls, conn) -> None:
+        """
+        Add tenant column and its indexes to tables created before tenants were introduced.
+        Existing rows get DEFAULT_TENANT.
+        """
+        inspector = inspect(conn)
+        default = DEFAULT_TENANT.replace("'", "''")
+        for table in (cls.users, cls.applications, cls.bundle_rules, cls.audit_log, cls.archived_applications):
+            if "tenant" in {column["name"] for column in inspector.get_columns(table.name)}:
+                continue
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN tenant VARCHAR NOT NULL DEFAULT '{default}'"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+    def add_change_listener(self, listener: Callable[[list[str], bool | None], Awaitable[None]]) -> None:
+        """
+        Register listener called after launch allowance of applications was changed or applications were removed.
+        Args:
+            listener (Callable[[list[str], bool | None], Awaitable[None]]): Called with application ids
+                and new launch allowance, or None if the applications were removed or moved to another tenant.
+        """
+        self.change_listeners.append(listener)
+
+    async def __notify_changed(self, bundle_ids: list[str], execution_status: bool | None) -> None:
+        for listener in self.change_listeners:
+            await listener(bundle_ids, execution_status)
+
+    async def create_user(self, login: str, password: str, tenant: str = DEFAULT_TENANT) -> None:
         """
         Create user for bot in database.
         Args:
             login (str): new user login.
             password (str): new user password.
+            tenant (str): tenant whose applications the user manages.
         """
         async with self.engine.connect() as conn:
-            query = insert(self.users).values(login=login, password=self.__get_password_hash(password))
+            query = insert(self.users).values(login=login, password=self.__get_password_hash(password), tenant=tenant)
             await conn.execute(query)
+            await conn.execute(self.__insert_missing_tenant(tenant))
             await conn.commit()
 
     async def validate_user(self, login: str, password: str) -> bool:
@@ -66,6 +209,73 @@ class DatabaseConnector:
             else:
                 return False
 
+    async def get_user_tenant(self, login: str) -> str | None:
+        """
+        Get tenant of user.
+        Args:
+            login (str): user login.
+        Returns:
+            str | None: Tenant, or None if the user does not exist.
+        """
+        async with self.engine.connect() as conn:
+            query = select(self.users.c.tenant).where(self.users.c.login == login)
+            result = await conn.execute(query)
+            tenant = result.fetchall()
+            return tenant[0][0] if len(tenant) > 0 else None
+
+    async def set_user_tenant(self, login: str, tenant: str) -> None:
+        """
+        Move user to another tenant.
+        Args:
+            login (str): user login.
+            tenant (str): new tenant.
+        """
+        async with self.engine.connect() as conn:
+            query = update(self.users).values(tenant=tenant).where(self.users.c.login == login)
+            await conn.execute(query)
+            await conn.execute(self.__insert_missing_tenant(tenant))
+            await conn.commit()
+
+    def __insert_missing_tenant(self, tenant: str):
+        """
+        Build query creating a tenant without quotas unless it exists, so the agent knows every tenant of users.
+        """
+        insert_func = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        return insert_func(self.tenants).values(name=tenant).on_conflict_do_nothing(index_elements=[self.tenants.c.name])
+
+    async def get_tenants(self) -> list[list[str, int | None, int | None]]:
+        """
+        Get tenants with their quotas.
+        Returns:
+            list[list[str, int | None, int | None]]: list of lists, where each inner list contains:
+                - str: tenant name.
+                - int | None: maximum number of applications, None if unlimited.
+                - int | None: maximum verify requests per second, None if unlimited.
+        """
+        async with self.engine.connect() as conn:
+            query = select(
+                self.tenants.c.name,
+                self.tenants.c.max_bundles,
+                self.tenants.c.max_requests_per_second
+            ).order_by(self.tenants.c.name)
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def set_tenant(self, name: str, max_bundles: int = None, max_requests_per_second: int = None) -> None:
+        """
+        Create tenant or update its quotas.
+        Args:
+            name (str): tenant name.
+            max_bundles (int): maximum number of applications, None if unlimited.
+            max_requests_per_second (int): maximum verify requests per second, None if unlimited.
+        """
+        async with self.engine.connect() as conn:
+            values = {"max_bundles": max_bundles, "max_requests_per_second": max_requests_per_second}
+            result = await conn.execute(update(self.tenants).values(**values).where(self.tenants.c.name == name))
+            if result.rowcount == 0:
+                await conn.execute(insert(self.tenants).values(name=name, **values))
+            await conn.commit()
+
     async def is_bundle_exists(self, bundle_id: str) -> bool:
         """
         Check is application exists in database.
@@ -80,7 +290,15 @@ class DatabaseConnector:
             bundle = result.fetchall()
             return len(bundle) > 0
 
-    async def check_or_create_bundle(self, bundle_id: str, ping_time: int = None) -> bool:
+    async def check_or_create_bundle(
+            self,
+            bundle_id: str,
+            ping_time: int = None,
+            on_create: Callable[[str, int], None] = None,
+            create_if_missing: bool = True,
+            tenant: str = DEFAULT_TENANT,
+            max_bundles: int = None
+    ) -> bool | None:
         """
         Check if the application launch is allowed.
         If the application exists, return its launch status.
@@ -90,19 +308,33 @@ class DatabaseConnector:
         Args:
             bundle_id (str): Application identifier (e.g., com.example.app).
             ping_time (int): Timestamp of the check.
+            on_create (Callable[[str, int], None]): Called with bundle id and ping time
+                after a new application has been created.
+            create_if_missing (bool): If False, a missing application is not created
+                and its launch is not allowed.
+            tenant (str): Tenant of the check. An application of another tenant is neither
+                allowed nor touched.
+            max_bundles (int): Quota of the tenant. A missing application is not created
+                and its launch is not allowed if the tenant already has this many applications.
 
         Returns:
-            bool: Whether the application launch is allowed.
+            bool | None: Whether the application launch is allowed.
+                None if the application was not created because of the quota or belongs to another tenant.
         """
 
         if ping_time is None:
             ping_time = int(time.time())
 
         async with self.engine.connect() as conn:
-            if await self.is_bundle_exists(bundle_id):
-                query = select(self.applications.c.allow_execution).where(self.applications.c.bundle_id == bundle_id)
-                result = await conn.execute(query)
-                allowance = result.fetchall()
+            query = (
+                select(self.applications.c.allow_execution, self.applications.c.tenant)
+                .where(self.applications.c.bundle_id == bundle_id)
+            )
+            result = await conn.execute(query)
+            allowance = result.fetchall()
+            if len(allowance) > 0:
+                if allowance[0][1] != tenant:
+                    return None
                 query = (
                     update(self.applications)
                     .values(last_access_time=ping_time)
@@ -111,59 +343,156 @@ class DatabaseConnector:
                 await conn.execute(query)
                 await conn.commit()
                 return allowance[0][0]
+            elif not create_if_missing:
+                return False
             else:
-                query = (
-                    insert(self.applications)
-                    .values(bundle_id=bundle_id, allow_execution=True, last_access_time=ping_time)
-                )
-                await conn.execute(query)
+                values = {"bundle_id": bundle_id, "allow_execution": True, "last_access_time": ping_time, "tenant": tenant}
+                insert_func = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+                if max_bundles is None:
+                    query = insert_func(self.applications).values(**values)
+                else:
+                    # The quota is checked by the insert itself, so concurrent checks cannot exceed it
+                    tenant_count = (
+                        select(func.count())
+                        .select_from(self.applications)
+                        .where(self.applications.c.tenant == tenant)
+                        .scalar_subquery()
+                    )
+                    query = insert_func(self.applications).from_select(
+                        list(values),
+                        select(*(literal(value) for value in values.values())).where(tenant_count < max_bundles)
+                    )
+                # A concurrent first check may insert the same application, that is not an error
+                query = query.on_conflict_do_nothing(index_elements=[self.applications.c.bundle_id])
+                result = await conn.execute(query)
                 await conn.commit()
+                if result.rowcount == 0:
+                    # Either the quota is reached or another check created the application first
+                    result = await conn.execute(
+                        select(self.applications.c.allow_execution, self.applications.c.tenant)
+                        .where(self.applications.c.bundle_id == bundle_id)
+                    )
+                    allowance = result.fetchall()
+                    if len(allowance) > 0 and allowance[0][1] == tenant:
+                        return allowance[0][0]
+                    return None
+                if on_create is not None:
+                    on_create(bundle_id, ping_time)
                 return True
 
-    async def change_execution_for_bundle(self, bundle_id: str, execution_status: bool) -> None:
+    async def change_execution_for_bundle(
+            self,
+            bundle_id: str,
+            execution_status: bool,
+            tenant: str = DEFAULT_TENANT
+    ) -> None:
         """
-        Set launch allowance for application.
+        Set launch allowance for application. A missing application is created in the tenant,
+        an application of another tenant is left as is.
         Args:
             bundle_id (str): Application identifier e.g. com.example.app.
             execution_status (bool): launch allowance.
+            tenant (str): tenant of the user making the change.
         """
         async with self.engine.connect() as conn:
-            if await self.is_bundle_exists(bundle_id):
-                query = (
-                    update(self.applications)
-                    .values(allow_execution=execution_status)
-                    .where(self.applications.c.bundle_id == bundle_id)
+            result = await conn.execute(select(self.applications.c.tenant).where(self.applications.c.bundle_id == bundle_id))
+            owner = result.fetchall()
+            if len(owner) == 0:
+                await self.check_or_create_bundle(bundle_id, tenant=tenant)
+            elif owner[0][0] != tenant:
+                return
+            query = (
+                update(self.applications)
+                .values(allow_execution=execution_status)
+                .where(self.applications.c.bundle_id == bundle_id)
+            )
+            await conn.execute(query)
+            await conn.commit()
+        await self.__notify_changed([bundle_id], execution_status)
+
+    async def change_execution_for_bundles(self, bundle_ids: list[str], execution_status: bool) -> list[str]:
+        """
+        Set launch allowance for many existing applications, one UPDATE per batch.
+        Args:
+            bundle_ids (list[str]): Application identifiers.
+            execution_status (bool): launch allowance.
+        Returns:
+            list[str]: Identifiers of applications that exist and were updated.
+        """
+        updated = []
+        for i in range(0, len(bundle_ids), MAINTENANCE_BATCH_SIZE):
+            batch = bundle_ids[i:i + MAINTENANCE_BATCH_SIZE]
+            async with self.engine.connect() as conn:
+                result = await conn.execute(
+                    select(self.applications.c.bundle_id).where(self.applications.c.bundle_id.in_(batch))
                 )
-                await conn.execute(query)
-                await conn.commit()
-            else:
-                await self.check_or_create_bundle(bundle_id)
+                existing = [row[0] for row in result.fetchall()]
+                if not existing:
+                    continue
                 query = (
                     update(self.applications)
                     .values(allow_execution=execution_status)
-                    .where(self.applications.c.bundle_id == bundle_id)
+                    .where(self.applications.c.bundle_id.in_(existing))
                 )
                 await conn.execute(query)
                 await conn.commit()
+            await self.__notify_changed(existing, execution_status)
+            updated.extend(existing)
+        return updated
 
-    async def remove_bundle(self, bundle_id: str) -> None:
+    async def remove_bundle(self, bundle_id: str, tenant: str = DEFAULT_TENANT) -> None:
         """
         Remove application from database.
         Args:
             bundle_id (str): Application identifier e.g. com.example.app.
+            tenant (str): tenant of the application.
         """
         async with self.engine.connect() as conn:
-            query = delete(self.applications).where(self.applications.c.bundle_id == bundle_id)
-            await conn.execute(query)
+            query = (
+                delete(self.applications)
+                .where(self.applications.c.bundle_id == bundle_id)
+                .where(self.applications.c.tenant == tenant)
+            )
+            result = await conn.execute(query)
+            await conn.commit()
+        if result.rowcount:
+            await self.__notify_changed([bundle_id], None)
+
+    async def move_bundle(self, bundle_id: str, tenant: str) -> str | None:
+        """
+        Move application to another tenant, e.g. when its identifier was claimed by the wrong tenant.
+        Launch allowance, ping rollups and schedules stay with the application.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            tenant (str): new tenant.
+        Returns:
+            str | None: Previous tenant, or None if the application does not exist.
+        """
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(self.applications.c.tenant).where(self.applications.c.bundle_id == bundle_id))
+            owner = result.fetchall()
+            if len(owner) == 0:
+                return None
+            await conn.execute(update(self.applications).values(tenant=tenant).where(self.applications.c.bundle_id == bundle_id))
+            await conn.execute(self.__insert_missing_tenant(tenant))
             await conn.commit()
+        # Cached answers carry the tenant, listeners drop them as for a removed application
+        await self.__notify_changed([bundle_id], None)
+        return owner[0][0]
 
-    async def get_bundles_list(self, limit: int, offset: int) -> tuple[int, list[list[str, bool]]]:
+    async def get_bundles_list(
+            self,
+            limit: int,
+            offset: int,
+            tenant: str = DEFAULT_TENANT
+    ) -> tuple[int, list[list[str, bool]]]:
         """
         Get the list of applications with a specified offset and limit on the number of rows.
 
         Args:
             limit (int): Maximum number of rows to return.
             offset (int): Number of rows to skip before starting to return rows.
+            tenant (str): Only applications of this tenant.
 
         Returns:
             int: Total number of applications in the database.
@@ -173,7 +502,7 @@ class DatabaseConnector:
                 - bool: Launch status.
         """
         async with self.engine.connect() as conn:
-            count_query = select(func.count()).select_from(self.applications)
+            count_query = select(func.count()).select_from(self.applications).where(self.applications.c.tenant == tenant)
             result = await conn.execute(count_query)
             count = result.fetchall()[0][0]
             if count == 0:
@@ -181,6 +510,7 @@ class DatabaseConnector:
             else:
                 data = (
                     select(self.applications.c.bundle_id, self.applications.c.allow_execution)
+                    .where(self.applications.c.tenant == tenant)
                     .limit(limit)
                     .offset(offset)
                     .order_by(desc(self.applications.c.last_access_time))
@@ -189,11 +519,12 @@ class DatabaseConnector:
                 data = result.fetchall()
                 return count, data
 
-    async def get_bundle_info(self, bundle_id: str) -> tuple[bool, int]:
+    async def get_bundle_info(self, bundle_id: str, tenant: str = DEFAULT_TENANT) -> tuple[bool, int]:
         """
         Get application info by application id.
         Args:
             bundle_id (str): Limit rows.
+            tenant (str): Tenant of the application, IndexError is raised for applications of other tenants.
         Returns:
             bool: Launch allowance.
 
@@ -203,6 +534,7 @@ class DatabaseConnector:
             bundle_status = (
                 select(self.applications.c.allow_execution, self.applications.c.last_access_time)
                 .where(self.applications.c.bundle_id == bundle_id)
+                .where(self.applications.c.tenant == tenant)
             )
             result = await conn.execute(bundle_status)
             result = result.fetchall()
@@ -292,12 +624,18 @@ class DatabaseConnector:
             await conn.execute(query)
             await conn.commit()
 
-    async def search_by_bundle_id(self, search_query: str, limit: int = 50) -> list[list[str, bool, int]]:
+    async def search_by_bundle_id(
+            self,
+            search_query: str,
+            limit: int = 50,
+            tenant: str = DEFAULT_TENANT
+    ) -> list[list[str, bool, int]]:
         """
         Search for applications by the substring that is inside the application identifier.
         Args:
             search_query (str): Substring for search.
             limit (int): Maximum number of rows to return.
+            tenant (str): Only applications of this tenant.
         Returns:
             list[list[Union[str, bool, int]]]: list of lists, where each inner list contains:
                 - str: application id.
@@ -311,7 +649,463 @@ class DatabaseConnector:
                     self.applications.c.allow_execution,
                     self.applications.c.last_access_time
                 )
+                .where(self.applications.c.tenant == tenant)
                 .where(self.applications.c.bundle_id.like(f"%{search_query}%"))
                 .limit(limit))
             data = await conn.execute(query)
             return data.fetchall()
+
+    async def get_bundle_rules(self, tenant: str = DEFAULT_TENANT) -> list[list[int, str, str]]:
+        """
+        Get allow/deny rules for unknown applications.
+        Args:
+            tenant (str): Tenant of the rules.
+        Returns:
+            list[list[int, str, str]]: list of lists, where each inner list contains:
+                - int: rule id.
+                - str: action, "allow" or "deny".
+                - str: pattern e.g. prefix:com.example.
+        """
+        async with self.engine.connect() as conn:
+            query = (
+                select(self.bundle_rules.c.id, self.bundle_rules.c.action, self.bundle_rules.c.pattern)
+                .where(self.bundle_rules.c.tenant == tenant)
+                .order_by(self.bundle_rules.c.id)
+            )
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def add_bundle_rule(self, action: str, pattern: str, tenant: str = DEFAULT_TENANT) -> None:
+        """
+        Add allow/deny rule.
+        Args:
+            action (str): "allow" or "deny".
+            pattern (str): Rule pattern e.g. prefix:com.example.
+            tenant (str): Tenant of the rule.
+        """
+        async with self.engine.connect() as conn:
+            query = insert(self.bundle_rules).values(action=action, pattern=pattern, tenant=tenant)
+            await conn.execute(query)
+            await conn.commit()
+
+    async def remove_bundle_rule(self, rule_id: int, tenant: str = DEFAULT_TENANT) -> None:
+        """
+        Remove allow/deny rule.
+        Args:
+            rule_id (int): Rule id.
+            tenant (str): Tenant of the rule.
+        """
+        async with self.engine.connect() as conn:
+            query = (
+                delete(self.bundle_rules)
+                .where(self.bundle_rules.c.id == rule_id)
+                .where(self.bundle_rules.c.tenant == tenant)
+            )
+            await conn.execute(query)
+            await conn.commit()
+
+    async def get_setting(self, key: str, default: str) -> str:
+        """
+        Get setting value.
+        Args:
+            key (str): Setting name.
+            default (str): Value returned if the setting is not stored.
+        Returns:
+            str: Setting value.
+        """
+        async with self.engine.connect() as conn:
+            query = select(self.settings.c.value).where(self.settings.c.key == key)
+            result = await conn.execute(query)
+            value = result.fetchall()
+            return value[0][0] if len(value) > 0 else default
+
+    async def set_setting(self, key: str, value: str) -> None:
+        """
+        Store setting value.
+        Args:
+            key (str): Setting name.
+            value (str): Setting value.
+        """
+        async with self.engine.connect() as conn:
+            query = update(self.settings).values(value=value).where(self.settings.c.key == key)
+            result = await conn.execute(query)
+            if result.rowcount == 0:
+                await conn.execute(insert(self.settings).values(key=key, value=value))
+            await conn.commit()
+
+    def __upsert_ping_counts(self):
+        insert_func = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        query = insert_func(self.ping_rollups)
+        return query.on_conflict_do_update(
+            index_elements=[
+                self.ping_rollups.c.bundle_id,
+                self.ping_rollups.c.resolution,
+                self.ping_rollups.c.bucket_start
+            ],
+            set_={"count": self.ping_rollups.c.count + query.excluded.count}
+        )
+
+    async def add_ping_counts(self, counts: dict[tuple[str, int], int]) -> None:
+        """
+        Add per-minute ping counts to rollups in one batch.
+        Counts for applications missing from the database are dropped.
+        Args:
+            counts (dict[tuple[str, int], int]): Ping count by application id and minute bucket start.
+        """
+        bundle_ids = list({bundle_id for bundle_id, _ in counts})
+        async with self.engine.connect() as conn:
+            existing = set()
+            for i in range(0, len(bundle_ids), 500):
+                query = (
+                    select(self.applications.c.bundle_id)
+                    .where(self.applications.c.bundle_id.in_(bundle_ids[i:i + 500]))
+                )
+                result = await conn.execute(query)
+                existing.update(row[0] for row in result)
+
+            rows = [
+                {"bundle_id": bundle_id, "resolution": MINUTE, "bucket_start": bucket_start, "count": count}
+                for (bundle_id, bucket_start), count in counts.items()
+                if bundle_id in existing
+            ]
+            if rows:
+                await conn.execute(self.__upsert_ping_counts(), rows)
+            await conn.commit()
+
+    async def compact_ping_rollups(self, now: int = None) -> None:
+        """
+        Downsample ping rollups: minute buckets older than PING_MINUTE_RETENTION_SECONDS
+        are merged into hour buckets, hour buckets older than PING_HOUR_RETENTION_SECONDS
+        into day buckets, and day buckets older than PING_DAY_RETENTION_SECONDS are removed.
+        Args:
+            now (int): Current timestamp.
+        """
+        if now is None:
+            now = int(time.time())
+
+        async with self.engine.connect() as conn:
+            for resolution, target, retention in (
+                    (MINUTE, HOUR, PING_MINUTE_RETENTION_SECONDS),
+                    (HOUR, DAY, PING_HOUR_RETENTION_SECONDS)
+            ):
+                bucket = self.ping_rollups.c.bucket_start - self.ping_rollups.c.bucket_start % target
+                stale = (
+                    (self.ping_rollups.c.resolution == resolution)
+                    & (self.ping_rollups.c.bucket_start < now - retention)
+                )
+                query = (
+                    select(self.ping_rollups.c.bundle_id, bucket, func.sum(self.ping_rollups.c.count))
+                    .where(stale)
+                    .group_by(self.ping_rollups.c.bundle_id, bucket)
+                )
+                result = await conn.execute(query)
+                rows = [
+                    {"bundle_id": bundle_id, "resolution": target, "bucket_start": bucket_start, "count": count}
+                    for bundle_id, bucket_start, count in result
+                ]
+                if rows:
+                    await conn.execute(self.__upsert_ping_counts(), rows)
+                    await conn.execute(delete(self.ping_rollups).where(stale))
+
+            query = (
+                delete(self.ping_rollups)
+                .where(self.ping_rollups.c.resolution == DAY)
+                .where(self.ping_rollups.c.bucket_start < now - PING_DAY_RETENTION_SECONDS)
+            )
+            await conn.execute(query)
+            await conn.commit()
+
+    async def get_bundle_activity(self, bundle_id: str, since: int) -> list[list[int, int, int]]:
+        """
+        Get ping rollups of application.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            since (int): Timestamp of the oldest bucket to return.
+        Returns:
+            list[list[int, int, int]]: list of lists, where each inner list contains:
+                - int: bucket resolution in seconds.
+                - int: bucket start timestamp.
+                - int: ping count.
+        """
+        async with self.engine.connect() as conn:
+            query = (
+                select(self.ping_rollups.c.resolution, self.ping_rollups.c.bucket_start, self.ping_rollups.c.count)
+                .where(self.ping_rollups.c.bundle_id == bundle_id)
+                .where(self.ping_rollups.c.bucket_start >= since)
+                .order_by(self.ping_rollups.c.bucket_start)
+            )
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def get_stale_bundles(self, older_than: int, limit: int = 20) -> tuple[int, list[list[str, int]]]:
+        """
+        Get allowed applications that were not checked since the given time, oldest first.
+        Blocked applications are never stale, reaping them would allow them again on the next check.
+        Args:
+            older_than (int): Timestamp of the last check to compare with.
+            limit (int): Maximum number of rows to return.
+        Returns:
+            int: Total number of stale applications.
+
+            list[list[str, int]]: A list of lists, where each inner list contains:
+                - str: Application identifier.
+                - int: Last access time.
+        """
+        async with self.engine.connect() as conn:
+            stale = and_(self.applications.c.last_access_time < older_than, self.applications.c.allow_execution.is_(True))
+            result = await conn.execute(select(func.count()).select_from(self.applications).where(stale))
+            count = result.fetchall()[0][0]
+            query = (
+                select(self.applications.c.bundle_id, self.applications.c.last_access_time)
+                .where(stale)
+                .order_by(self.applications.c.last_access_time)
+                .limit(limit)
+            )
+            result = await conn.execute(query)
+            return count, result.fetchall()
+
+    async def reap_stale_bundles(self, older_than: int, archive: bool, batch_size: int) -> int:
+        """
+        Archive or delete allowed applications that were not checked since the given time,
+        together with their ping rollups and schedules. Blocked applications are kept.
+        Works in batches, each in its own short transaction, so the write lock is never held for long.
+        Args:
+            older_than (int): Timestamp of the last check to compare with.
+            archive (bool): Copy applications to archived_applications before deleting.
+            batch_size (int): Maximum number of applications per transaction.
+        Returns:
+            int: Number of reaped applications.
+        """
+        reaped = 0
+        while True:
+            async with self.engine.connect() as conn:
+                query = (
+                    select(
+                        self.applications.c.id,
+                        self.applications.c.bundle_id,
+                        self.applications.c.allow_execution,
+                        self.applications.c.last_access_time,
+                        self.applications.c.tenant
+                    )
+                    .where(self.applications.c.last_access_time < older_than)
+                    .where(self.applications.c.allow_execution.is_(True))
+                    .limit(batch_size)
+                )
+                result = await conn.execute(query)
+                rows = result.fetchall()
+                if not rows:
+                    return reaped
+                if archive:
+                    archived_at = int(time.time())
+                    await conn.execute(
+                        insert(self.archived_applications),
+                        [
+                            {
+                                "bundle_id": bundle_id,
+                                "allow_execution": allow_execution,
+                                "last_access_time": last_access_time,
+                                "archived_at": archived_at,
+                                "tenant": tenant
+                            }
+                            for _, bundle_id, allow_execution, last_access_time, tenant in rows
+                        ]
+                    )
+                bundle_ids = [row[1] for row in rows]
+                await conn.execute(delete(self.applications).where(self.applications.c.id.in_([row[0] for row in rows])))
+                await conn.execute(delete(self.ping_rollups).where(self.ping_rollups.c.bundle_id.in_(bundle_ids)))
+                await conn.execute(delete(self.bundle_schedules).where(self.bundle_schedules.c.bundle_id.in_(bundle_ids)))
+                await conn.commit()
+            await self.__notify_changed(bundle_ids, None)
+            reaped += len(rows)
+            if len(rows) < batch_size:
+                return reaped
+            await asyncio.sleep(0)
+
+    async def optimize_tables(self) -> None:
+        """
+        Reclaim free space and refresh planner statistics (VACUUM and ANALYZE).
+        """
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if self.engine.dialect.name == "postgresql":
+                await conn.execute(text("VACUUM ANALYZE"))
+            else:
+                await conn.execute(text("VACUUM"))
+                await conn.execute(text("ANALYZE"))
+
+    async def get_allowances(self) -> list[list[str, bool, str]]:
+        """
+        Get launch allowance of all applications.
+        Returns:
+            list[list[str, bool, str]]: A list of lists, where each inner list contains:
+                - str: Application identifier.
+                - bool: Launch status.
+                - str: Tenant.
+        """
+        async with self.engine.connect() as conn:
+            query = select(self.applications.c.bundle_id, self.applications.c.allow_execution, self.applications.c.tenant)
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def set_last_access_times(self, ping_times: dict[str, int]) -> None:
+        """
+        Update last launch permission check time of many applications in one batch.
+        Args:
+            ping_times (dict[str, int]): Last check timestamp by application id.
+        """
+        if not ping_times:
+            return
+        async with self.engine.connect() as conn:
+            query = (
+                update(self.applications)
+                .where(self.applications.c.bundle_id == bindparam("b_bundle_id"))
+                .values(last_access_time=bindparam("b_ping_time"))
+            )
+            await conn.execute(
+                query,
+                [{"b_bundle_id": bundle_id, "b_ping_time": ping_time} for bundle_id, ping_time in ping_times.items()]
+            )
+            await conn.commit()
+
+    async def get_bundles_state(self, bundle_ids: list[str] = None) -> list[list[str, bool, int, str]]:
+        """
+        Get launch allowance, last check time and tenant of applications.
+        Args:
+            bundle_ids (list[str]): Application identifiers. All applications if None.
+        Returns:
+            list[list[str, bool, int, str]]: A list of lists, where each inner list contains:
+                - str: Application identifier.
+                - bool: Launch status.
+                - int: Last access time.
+                - str: Tenant.
+        """
+        async with self.engine.connect() as conn:
+            query = select(
+                self.applications.c.bundle_id,
+                self.applications.c.allow_execution,
+                self.applications.c.last_access_time,
+                self.applications.c.tenant
+            )
+            if bundle_ids is not None:
+                query = query.where(self.applications.c.bundle_id.in_(bundle_ids))
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def add_audit_events(self, events: list[dict]) -> None:
+        """
+        Append audit events in one statement.
+        Args:
+            events (list[dict]): Events with created_at, actor, action, bundle_id, details and tenant keys.
+        """
+        if not events:
+            return
+        async with self.engine.connect() as conn:
+            await conn.execute(insert(self.audit_log), events)
+            await conn.commit()
+
+    async def get_audit_events(
+            self,
+            bundle_id: str = None,
+            actor: str = None,
+            limit: int = 20,
+            tenant: str = None
+    ) -> list[list[int, str, str, str | None, str | None]]:
+        """
+        Get latest audit events, newest first.
+        Args:
+            bundle_id (str): Only events of this application.
+            actor (str): Only events made by this user.
+            limit (int): Maximum number of rows to return.
+            tenant (str): Only events of this tenant, events of all tenants if None.
+        Returns:
+            list[list[int, str, str, str | None, str | None]]: list of lists, where each inner list contains:
+                - int: event timestamp.
+                - str: actor.
+                - str: action.
+                - str | None: application identifier.
+                - str | None: details.
+        """
+        async with self.engine.connect() as conn:
+            query = select(
+                self.audit_log.c.created_at,
+                self.audit_log.c.actor,
+                self.audit_log.c.action,
+                self.audit_log.c.bundle_id,
+                self.audit_log.c.details
+            )
+            if bundle_id is not None:
+                query = query.where(self.audit_log.c.bundle_id == bundle_id)
+            if actor is not None:
+                query = query.where(self.audit_log.c.actor == actor)
+            if tenant is not None:
+                query = query.where(self.audit_log.c.tenant == tenant)
+            query = query.order_by(desc(self.audit_log.c.created_at), desc(self.audit_log.c.id)).limit(limit)
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def add_schedule(
+            self,
+            bundle_id: str,
+            kind: str,
+            allow: bool,
+            ends_at: int = None,
+            restore: bool = None,
+            window_start: int = None,
+            window_end: int = None
+    ) -> int:
+        """
+        Add scheduled launch allowance change.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            kind (str): "timebox" or "window".
+            allow (bool): Launch allowance until ends_at, or inside the daily window.
+            ends_at (int): Timestamp when a timebox ends.
+            restore (bool): Launch allowance set when a timebox ends.
+            window_start (int): Start of the daily window, minutes after midnight.
+            window_end (int): End of the daily window, minutes after midnight.
+        Returns:
+            int: Schedule id.
+        """
+        async with self.engine.connect() as conn:
+            query = insert(self.bundle_schedules).values(
+                bundle_id=bundle_id,
+                kind=kind,
+                allow=allow,
+                ends_at=ends_at,
+                restore=restore,
+                window_start=window_start,
+                window_end=window_end
+            )
+            result = await conn.execute(query)
+            await conn.commit()
+            return result.inserted_primary_key[0]
+
+    async def get_schedules(self, bundle_id: str = None, schedule_ids: list[int] = None) -> list:
+        """
+        Get scheduled launch allowance changes.
+        Args:
+            bundle_id (str): Only schedules of this application.
+            schedule_ids (list[int]): Only schedules with these ids.
+        Returns:
+            list: Rows with id, bundle_id, kind, allow, ends_at, restore, window_start and window_end.
+        """
+        async with self.engine.connect() as conn:
+            query = select(self.bundle_schedules).order_by(self.bundle_schedules.c.id)
+            if bundle_id is not None:
+                query = query.where(self.bundle_schedules.c.bundle_id == bundle_id)
+            if schedule_ids is not None:
+                query = query.where(self.bundle_schedules.c.id.in_(schedule_ids))
+            result = await conn.execute(query)
+            return result.fetchall()
+
+    async def remove_schedules(self, schedule_ids: list[int]) -> None:
+        """
+        Remove scheduled launch allowance changes.
+        Args:
+            schedule_ids (list[int]): Schedule ids.
+        """
+        if not schedule_ids:
+            return
+        async with self.engine.connect() as conn:
+            await conn.execute(delete(self.bundle_schedules).where(self.bundle_schedules.c.id.in_(schedule_ids)))
+            await conn.commit()
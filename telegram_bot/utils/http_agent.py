@@ -1,41 +1,297 @@
+import asyncio
+import logging
+from functools import partial
 from multiprocessing import Process
 import time
 
 import uvicorn
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from sqlalchemy.exc import InterfaceError, OperationalError
+from utils.allowance_store import RedisAllowanceStore
+from utils.bundle_events import NewBundlesPublisher
+from utils.bundle_registry import BundleRegistry
+from utils.bundle_rules import BundleRules, ALLOW_POLICY
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
 from utils.database_connector import DatabaseConnector
+from utils.invalidation import InvalidationBus
+from utils.ping_counters import PingCounters
+from utils.tenants import Tenant, load_tenants
 
 from telegram_bot.config import (
     DB_CONNECTION_STRING,
+    REDIS_CONNECTION_STRING,
     APP_ID_HEADER,
+    TENANT_HEADER,
+    DEFAULT_TENANT,
     BLOCKED_RESPONSE,
     OK_RESPONSE,
     LISTEN_HOST,
-    LISTEN_PORT
+    LISTEN_PORT,
+    ALLOWANCE_STORE,
+    BUNDLE_REGISTRY_SNAPSHOT,
+    BUNDLE_REGISTRY_RELOAD_SECONDS,
+    VERIFY_REDIS_TIMEOUT_SECONDS,
+    DEGRADED_BUNDLE_POLICY,
+    UNKNOWN_BUNDLE_CACHE_SECONDS,
+    UNKNOWN_BUNDLE_CACHE_SIZE
 )
 
 
 class HTTPAgent:
-    app = FastAPI()
-    db = DatabaseConnector(DB_CONNECTION_STRING)
+    """
+    Class that serves launch allowance checks for applications.
+    It is created inside the agent process by create_app(), so the bot process never pays for it.
+    Launch allowance is answered from the in-memory bundle registry, or from the Redis allowance store
+    shared by replicas if ALLOWANCE_STORE is "redis". Database and Redis calls of a check go through
+    circuit breakers; when they fail or are saturated the check is answered from the bundle registry
+    or by DEGRADED_BUNDLE_POLICY instead of waiting.
+    """
 
     def __init__(self):
-        @self.app.get("/")
-        async def verify_app(request: Request):
-            header = request.headers.get(APP_ID_HEADER)
-            if header is None:
-                return Response(BLOCKED_RESPONSE)
-            else:
-                if await self.db.check_or_create_bundle(header):
-                    return Response(OK_RESPONSE)
-                else:
-                    return Response(BLOCKED_RESPONSE)
+        self.db = DatabaseConnector(DB_CONNECTION_STRING)
+        self.redis = Redis.from_url(REDIS_CONNECTION_STRING)
+        self.new_bundles = NewBundlesPublisher(self.redis)
+        self.invalidation = InvalidationBus(self.redis)
+        self.tenants: dict[str, Tenant] = {}
+        self.allowance_store = RedisAllowanceStore(self.redis) if ALLOWANCE_STORE == "redis" else None
+        self.ping_counters = PingCounters(self.db, track_last_pings=self.allowance_store is None)
+        self.registry = BundleRegistry()
+        self.listener: asyncio.Task | None = None
+        self.registry_reloader: asyncio.Task | None = None
+        self.full_reload_lock = asyncio.Lock()
+        self.invalidated_during_reload: set[str] | None = None
+        self.unknown_bundles: dict[tuple[str, str], int] = {}
+        # Only an unavailable dependency opens a breaker, not e.g. a constraint violation
+        self.db_breaker = CircuitBreaker(failure_types=(OperationalError, InterfaceError, OSError))
+        self.store_breaker = CircuitBreaker(
+            timeout=VERIFY_REDIS_TIMEOUT_SECONDS,
+            failure_types=(RedisConnectionError, RedisTimeoutError, OSError)
+        )
+        self.degraded_responses = 0
 
-        self.server = Process(target=uvicorn.run, kwargs={"app": self.app, "host": LISTEN_HOST, "port": LISTEN_PORT})
-        self.server.start()
+        self.app = FastAPI(on_startup=[self.startup], on_shutdown=[self.shutdown])
+        self.app.add_api_route("/", self.verify_app, methods=["GET"])
+        self.app.add_api_route("/metrics", self.metrics, methods=["GET"])
+        self.app.add_api_route("/{tenant}", self.verify_app, methods=["GET"])
+
+    async def startup(self) -> None:
+        await self.db.ensure_schema()
+        self.registry = BundleRegistry.load(BUNDLE_REGISTRY_SNAPSHOT)
+        await self.reload_tenants("")
+        self.invalidation.subscribe("rules", self.reload_tenants)
+        self.invalidation.subscribe("tenants", self.reload_tenants)
+        self.invalidation.subscribe("bundles", self.reload_bundles)
+        self.listener = asyncio.create_task(self.invalidation.run())
+        self.registry_reloader = asyncio.create_task(self.__reload_registry_forever())
+        await self.new_bundles.start()
+        await self.ping_counters.start()
+        if self.allowance_store is not None:
+            await self.allowance_store.start(self.db)
+
+    async def shutdown(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+        if self.registry_reloader is not None:
+            self.registry_reloader.cancel()
+        self.registry.save(BUNDLE_REGISTRY_SNAPSHOT)
+        await self.new_bundles.stop()
+        await self.ping_counters.stop()
+        if self.allowance_store is not None:
+            await self.allowance_store.stop(self.db)
+        await self.redis.aclose()
+
+    async def reload_tenants(self, _payload: str) -> None:
+        self.tenants = await load_tenants(self.db, self.tenants)
+        self.unknown_bundles.clear()
+
+    async def reload_bundles(self, payload: str) -> None:
+        """
+        Refresh registry records of changed applications, or the whole registry if payload is empty.
+        Args:
+            payload (str): Changed application ids separated by new lines.
+        """
+        if not payload:
+            async with self.full_reload_lock:
+                self.invalidated_during_reload = set()
+                try:
+                    self.registry.replace(await self.db.get_bundles_state())
+                    invalidated = self.invalidated_during_reload
+                finally:
+                    self.invalidated_during_reload = None
+                # Changes published while the table was read may be missing from it, read them again.
+                if invalidated:
+                    await self.__refresh_bundles(list(invalidated))
+                self.registry.save(BUNDLE_REGISTRY_SNAPSHOT)
+            return
+
+        bundle_ids = payload.split("\n")
+        if self.invalidated_during_reload is not None:
+            self.invalidated_during_reload.update(bundle_ids)
+        await self.__refresh_bundles(bundle_ids)
+
+    async def __refresh_bundles(self, bundle_ids: list[str]) -> None:
+        found = set()
+        for bundle_id, allow_execution, last_access_time, tenant in await self.db.get_bundles_state(bundle_ids):
+            self.registry.set(bundle_id, allow_execution, last_access_time, tenant)
+            found.add(bundle_id)
+        for bundle_id in bundle_ids:
+            if bundle_id not in found:
+                self.registry.remove(bundle_id)
+
+    async def __reload_registry_forever(self) -> None:
+        """
+        Reload the whole registry every BUNDLE_REGISTRY_RELOAD_SECONDS. The first reload after start
+        is made by the invalidation listener, which reloads everything when it connects.
+        """
+        while True:
+            await asyncio.sleep(BUNDLE_REGISTRY_RELOAD_SECONDS)
+            try:
+                await self.reload_bundles("")
+            except Exception:  # noqa
+                logging.exception("Failed to reload bundle registry")
+
+    async def verify_app(self, request: Request, tenant: str = None) -> Response:
+        header = request.headers.get(APP_ID_HEADER)
+        if header is None:
+            return Response(BLOCKED_RESPONSE)
+
+        tenant = self.tenants.get(tenant or request.headers.get(TENANT_HEADER, DEFAULT_TENANT))
+        if tenant is None:
+            return Response(BLOCKED_RESPONSE)
+        if tenant.limiter is not None and not tenant.limiter.allow():
+            return Response(status_code=429)
+
+        ping_time = int(time.time())
+        if self.allowance_store is None:
+            allowance = self.registry.touch(header, ping_time, tenant.name)
+        else:
+            # The shared store holds the state and collects pings, the registry only keeps
+            # the last known answers for the time the store is unavailable.
+            succeeded, allowance = await self.__guarded(
+                self.store_breaker, self.allowance_store.check, header, ping_time, tenant.name
+            )
+            if allowance is not None:
+                self.registry.set(header, allowance, ping_time, tenant.name)
+            elif not succeeded:
+                allowance = self.registry.touch(header, ping_time, tenant.name)
+        if allowance is not None:
+            self.ping_counters.hit(header, ping_time)
+            return Response(OK_RESPONSE if allowance else BLOCKED_RESPONSE)
+
+        # Rules only apply to applications the agent does not know
+        verdict = tenant.rules.check(header)
+        if verdict == BundleRules.REJECT:
+            return Response(BLOCKED_RESPONSE)
+        unknown_key = (tenant.name, header)
+        if verdict == BundleRules.KNOWN_ONLY and self.unknown_bundles.get(unknown_key, 0) > ping_time:
+            return Response(BLOCKED_RESPONSE)
+
+        succeeded, allowance = await self.__guarded(
+            self.db_breaker,
+            self.db.check_or_create_bundle,
+            header,
+            ping_time,
+            on_create=partial(self.new_bundles.publish, tenant=tenant.name),
+            create_if_missing=verdict == BundleRules.ALLOW,
+            tenant=tenant.name,
+            max_bundles=tenant.max_bundles
+        )
+        if not succeeded:
+            self.degraded_responses += 1
+            allowance = verdict == BundleRules.ALLOW and DEGRADED_BUNDLE_POLICY == ALLOW_POLICY
+            return Response(OK_RESPONSE if allowance else BLOCKED_RESPONSE)
+
+        # None means the application belongs to another tenant or the quota is reached
+        if allowance is not None:
+            self.ping_counters.hit(header, ping_time)
+        if verdict == BundleRules.KNOWN_ONLY and not allowance:
+            # Missing or blocked, answered without the database until the entry expires or rules change
+            self.__remember_unknown(unknown_key, ping_time)
+        elif allowance is not None:
+            self.registry.set(header, allowance, ping_time, tenant.name)
+            if self.allowance_store is not None:
+                await self.__guarded(self.store_breaker, self.allowance_store.set, header, allowance, tenant.name)
+        return Response(OK_RESPONSE if allowance else BLOCKED_RESPONSE)
+
+    def __remember_unknown(self, key: tuple[str, str], ping_time: int) -> None:
+        """
+        Remember an application that is not allowed to be created and is not allowed to launch,
+        evicting the oldest entry when the cache is full.
+        """
+        self.unknown_bundles.pop(key, None)
+        if len(self.unknown_bundles) >= UNKNOWN_BUNDLE_CACHE_SIZE:
+            del self.unknown_bundles[next(iter(self.unknown_bundles))]
+        self.unknown_bundles[key] = ping_time + UNKNOWN_BUNDLE_CACHE_SECONDS
+
+    async def metrics(self) -> PlainTextResponse:
+        """
+        Degraded mode metrics of this agent process in Prometheus text format.
+        """
+        lines = [
+            "# HELP access_bot_verify_degraded_seconds_total Time the circuit breaker of a dependency was open.",
+            "# TYPE access_bot_verify_degraded_seconds_total counter"
+        ]
+        breakers = {"database": self.db_breaker, "redis": self.store_breaker}
+        for dependency, breaker in breakers.items():
+            lines.append(
+                f'access_bot_verify_degraded_seconds_total{{dependency="{dependency}"}} '
+                f"{breaker.degraded_seconds_total():.3f}"
+            )
+        lines += [
+            "# HELP access_bot_verify_circuit_open Whether the circuit breaker of a dependency is open.",
+            "# TYPE access_bot_verify_circuit_open gauge"
+        ]
+        for dependency, breaker in breakers.items():
+            lines.append(f'access_bot_verify_circuit_open{{dependency="{dependency}"}} {int(breaker.is_open)}')
+        lines += [
+            "# HELP access_bot_verify_degraded_responses_total Checks answered without the database.",
+            "# TYPE access_bot_verify_degraded_responses_total counter",
+            f"access_bot_verify_degraded_responses_total {self.degraded_responses}"
+        ]
+        return PlainTextResponse("\n".join(lines) + "\n")
+
+    @staticmethod
+    async def __guarded(breaker: CircuitBreaker, func, *args, **kwargs) -> tuple[bool, object]:
+        """
+        Call a dependency of the check through its circuit breaker.
+        Returns:
+            bool: True if the call succeeded.
+
+            object: Result of the call, None if it failed.
+        """
+        try:
+            return True, await breaker.call(func, *args, **kwargs)
+        except CircuitOpenError:
+            return False, None
+        except Exception:  # noqa
+            logging.exception("Check dependency call %s failed", func.__qualname__)
+            return False, None
+
+
+def create_app() -> FastAPI:
+    """
+    Application factory for uvicorn.
+    """
+    return HTTPAgent().app
+
+
+def serve() -> None:
+    uvicorn.run("utils.http_agent:create_app", factory=True, host=LISTEN_HOST, port=LISTEN_PORT)
+
+
+def start_http_agent() -> Process:
+    """
+    Start the agent in a separate process.
+    Returns:
+        Process: Agent process.
+    """
+    server = Process(target=serve)
+    server.start()
+    return server
 
 
 if __name__ == "__main__":
-    HTTPAgent()
-    while True:
-        time.sleep(1)
+    serve()
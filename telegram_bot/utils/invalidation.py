@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from telegram_bot.config import INVALIDATION_CHANNEL
+
+
+class InvalidationBus:
+    """
+    Class that notifies every bot and agent process through Redis pub/sub
+    that state cached in memory must be reloaded.
+    """
+
+    def __init__(self, redis: Redis, channel: str = INVALIDATION_CHANNEL):
+        self.redis = redis
+        self.channel = channel
+        self.callbacks: dict[str, list[Callable[[str], Awaitable[None]]]] = {}
+
+    def subscribe(self, topic: str, callback: Callable[[str], Awaitable[None]]) -> None:
+        """
+        Register callback for topic.
+        Args:
+            topic (str): Topic name e.g. rules.
+            callback (Callable[[str], Awaitable[None]]): Called with the message payload.
+                Empty payload means "reload everything".
+        """
+        self.callbacks.setdefault(topic, []).append(callback)
+
+    async def publish(self, topic: str, payload: str = "") -> None:
+        """
+        Publish invalidation message for all subscribed processes.
+        Args:
+            topic (str): Topic name e.g. rules.
+            payload (str): Topic-specific payload.
+        """
+        await self.redis.publish(self.channel, f"{topic}:{payload}")
+
+    async def run(self) -> None:
+        """
+        Listen for messages forever. After every (re)connect all callbacks are called
+        with empty payload, because messages published while disconnected are lost.
+        """
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    await self.__dispatch_all("")
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        topic, _, payload = message["data"].decode().partition(":")
+                        for callback in self.callbacks.get(topic, []):
+                            await self.__call(callback, payload)
+            except RedisError:
+                logging.exception("Invalidation channel connection lost")
+                await asyncio.sleep(5)
+
+    async def __dispatch_all(self, payload: str) -> None:
+        for callbacks in self.callbacks.values():
+            for callback in callbacks:
+                await self.__call(callback, payload)
+
+    @staticmethod
+    async def __call(callback: Callable[[str], Awaitable[None]], payload: str) -> None:
+        try:
+            await callback(payload)
+        except Exception:  # noqa
+            logging.exception("Invalidation callback failed")
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from telegram_bot.config import (
+    STALE_BUNDLE_DAYS,
+    STALE_BUNDLE_ACTION,
+    MAINTENANCE_INTERVAL_SECONDS,
+    MAINTENANCE_BATCH_SIZE
+)
+from telegram_bot.strings import MAINTENANCE_REPORT, STALE_BUNDLES_ARCHIVED, STALE_BUNDLES_DELETED
+from utils.audit_log import AuditLog, REAP_STALE_BUNDLES, MAINTENANCE_ACTOR
+from utils.database_connector import DatabaseConnector, DAY
+
+
+class Maintenance:
+    """
+    Class that periodically archives or deletes applications that stopped checking
+    their launch allowance and optimizes the database tables.
+    """
+
+    def __init__(
+            self,
+            db: DatabaseConnector,
+            notify: Callable[[str], Awaitable[None]] = None,
+            audit_log: AuditLog = None,
+            stale_days: int = STALE_BUNDLE_DAYS,
+            archive: bool = STALE_BUNDLE_ACTION == "archive"
+    ):
+        self.db = db
+        self.notify = notify
+        self.audit_log = audit_log
+        self.stale_days = stale_days
+        self.archive = archive
+
+    def stale_threshold(self) -> int:
+        return int(time.time()) - self.stale_days * DAY
+
+    async def dry_run(self, limit: int = 20) -> tuple[int, list[list[str, int]]]:
+        """
+        Find applications that would be reaped without changing anything.
+        Args:
+            limit (int): Maximum number of applications to return.
+        Returns:
+            int: Total number of stale applications.
+
+            list[list[str, int]]: Oldest stale applications with their last access time.
+        """
+        return await self.db.get_stale_bundles(self.stale_threshold(), limit)
+
+    async def run_once(self, actor: str = MAINTENANCE_ACTOR) -> str:
+        """
+        Reap stale applications and optimize tables.
+        Args:
+            actor (str): Who started the run, recorded in the audit log.
+        Returns:
+            str: Report of what was done.
+        """
+        started = time.monotonic()
+        reaped = await self.db.reap_stale_bundles(self.stale_threshold(), self.archive, MAINTENANCE_BATCH_SIZE)
+        if self.audit_log is not None and reaped:
+            self.audit_log.record(
+                actor,
+                REAP_STALE_BUNDLES,
+                details=f"{'archived' if self.archive else 'deleted'} {reaped}, no checks for {self.stale_days} days"
+            )
+        await self.db.optimize_tables()
+        return MAINTENANCE_REPORT.format(
+            stale=(STALE_BUNDLES_ARCHIVED if self.archive else STALE_BUNDLES_DELETED).format(
+                count=reaped,
+                days=self.stale_days
+            ),
+            seconds=round(time.monotonic() - started, 1)
+        )
+
+    async def run(self) -> None:
+        """
+        Run maintenance every MAINTENANCE_INTERVAL_SECONDS forever and send reports.
+        The first run happens one interval after start, so restarts do not trigger VACUUM.
+        """
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+            try:
+                report = await self.run_once()
+            except Exception:  # noqa
+                logging.exception("Maintenance failed")
+                continue
+            logging.info(report)
+            if self.notify is None:
+                continue
+            try:
+                await self.notify(report)
+            except Exception:  # noqa
+                logging.exception("Failed to send maintenance report")
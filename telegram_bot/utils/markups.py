@@ -5,14 +5,35 @@ from telegram_bot.strings import (
     LOGOUT_BUTTON,
     BUNDLE_SWITCH_DENY_BUTTON,
     BUNDLE_SWITCH_ALLOW_BUTTON,
-    BUNDLE_REMOVE_BUTTON
+    BUNDLE_REMOVE_BUTTON,
+    NEW_BUNDLES_NOTIFICATIONS_BUTTON,
+    NEW_BUNDLE_BLOCK_BUTTON,
+    BUNDLE_RULES_BUTTON,
+    SWITCH_DEFAULT_POLICY_BUTTON,
+    ADD_ALLOW_RULE_BUTTON,
+    ADD_DENY_RULE_BUTTON,
+    REMOVE_BUNDLE_RULE_BUTTON,
+    BUNDLE_ACTIVITY_BUTTON,
+    TO_BUNDLE_BUTTON,
+    AUDIT_LOG_BUTTON,
+    BUNDLE_AUDIT_BUTTON,
+    BUNDLE_SCHEDULES_BUTTON,
+    BLOCK_FOR_HOURS_BUTTON,
+    ADD_ALLOW_WINDOW_BUTTON,
+    ADD_DENY_WINDOW_BUTTON,
+    REMOVE_SCHEDULE_BUTTON
 )
+from telegram_bot.config import SCHEDULE_BLOCK_HOURS
+from utils.bundle_buttons import button_key
 
 
 def main_screen_keyboard_markup() -> ReplyKeyboardMarkup:
     markup = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text=BUNDLES_LIST_BUTTON)],
+            [KeyboardButton(text=NEW_BUNDLES_NOTIFICATIONS_BUTTON)],
+            [KeyboardButton(text=BUNDLE_RULES_BUTTON)],
+            [KeyboardButton(text=AUDIT_LOG_BUTTON)],
             [KeyboardButton(text=LOGOUT_BUTTON)]
         ]
     )
@@ -20,17 +41,23 @@ def main_screen_keyboard_markup() -> ReplyKeyboardMarkup:
 
 
 def edit_bundle_inline_markup(bundle_id: str, switch_from: bool) -> InlineKeyboardMarkup:
+    key = button_key(bundle_id)
     if switch_from:
-        switch_to = InlineKeyboardButton(text=BUNDLE_SWITCH_DENY_BUTTON, callback_data=f"block_bundle@{bundle_id}")
+        switch_to = InlineKeyboardButton(text=BUNDLE_SWITCH_DENY_BUTTON, callback_data=f"block_bundle@{key}")
     else:
-        switch_to = InlineKeyboardButton(text=BUNDLE_SWITCH_ALLOW_BUTTON, callback_data=f"allow_bundle@{bundle_id}")
+        switch_to = InlineKeyboardButton(text=BUNDLE_SWITCH_ALLOW_BUTTON, callback_data=f"allow_bundle@{key}")
 
     back_button = InlineKeyboardButton(text=BUNDLES_LIST_BUTTON, callback_data="view_apps@0")
-    remove_bundle = InlineKeyboardButton(text=BUNDLE_REMOVE_BUTTON, callback_data=f"remove_bundle@{bundle_id}")
+    remove_bundle = InlineKeyboardButton(text=BUNDLE_REMOVE_BUTTON, callback_data=f"remove_bundle@{key}")
+    activity = InlineKeyboardButton(text=BUNDLE_ACTIVITY_BUTTON, callback_data=f"bundle_activity@{key}")
+    history = InlineKeyboardButton(text=BUNDLE_AUDIT_BUTTON, callback_data=f"bundle_audit@{key}")
+    schedule = InlineKeyboardButton(text=BUNDLE_SCHEDULES_BUTTON, callback_data=f"bundle_schedules@{key}")
 
     markup = InlineKeyboardMarkup(
         inline_keyboard=[
             [switch_to],
+            [activity, history],
+            [schedule],
             [remove_bundle],
             [back_button]
         ]
@@ -38,6 +65,82 @@ def edit_bundle_inline_markup(bundle_id: str, switch_from: bool) -> InlineKeyboa
     return markup
 
 
+def back_to_bundle_inline_markup(bundle_id: str) -> InlineKeyboardMarkup:
+    markup = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=TO_BUNDLE_BUTTON, callback_data=f"control_bundle@{button_key(bundle_id)}")]
+        ]
+    )
+    return markup
+
+
+def bundle_schedules_inline_markup(bundle_id: str, schedules: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+    key = button_key(bundle_id)
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                text=BLOCK_FOR_HOURS_BUTTON.format(hours=hours),
+                callback_data=f"block_for@{hours}@{key}"
+            )
+            for hours in SCHEDULE_BLOCK_HOURS
+        ],
+        [InlineKeyboardButton(text=ADD_ALLOW_WINDOW_BUTTON, callback_data=f"add_window@allow@{key}")],
+        [InlineKeyboardButton(text=ADD_DENY_WINDOW_BUTTON, callback_data=f"add_window@deny@{key}")]
+    ]
+    for schedule_id, description in schedules:
+        keyboard.append(
+            [
+                InlineKeyboardButton(
+                    text=REMOVE_SCHEDULE_BUTTON.format(schedule=description),
+                    callback_data=f"remove_schedule@{schedule_id}"
+                )
+            ]
+        )
+    keyboard.append([InlineKeyboardButton(text=TO_BUNDLE_BUTTON, callback_data=f"control_bundle@{key}")])
+    markup = InlineKeyboardMarkup(
+        inline_keyboard=keyboard
+    )
+    return markup
+
+
+def new_bundles_digest_markup(bundle_ids: list[str]) -> InlineKeyboardMarkup:
+    markup = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=NEW_BUNDLE_BLOCK_BUTTON.format(bundle=bundle_id),
+                    callback_data=f"block_new_bundle@{button_key(bundle_id)}"
+                )
+            ]
+            for bundle_id in bundle_ids
+        ]
+    )
+    return markup
+
+
+def bundle_rules_inline_markup(rules: list[list[int, str, str]]) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(text=SWITCH_DEFAULT_POLICY_BUTTON, callback_data="switch_default_policy")],
+        [
+            InlineKeyboardButton(text=ADD_ALLOW_RULE_BUTTON, callback_data="add_rule@allow"),
+            InlineKeyboardButton(text=ADD_DENY_RULE_BUTTON, callback_data="add_rule@deny")
+        ]
+    ]
+    for rule_id, action, pattern in rules:
+        keyboard.append(
+            [
+                InlineKeyboardButton(
+                    text=REMOVE_BUNDLE_RULE_BUTTON.format(action=action, pattern=pattern),
+                    callback_data=f"remove_rule@{rule_id}"
+                )
+            ]
+        )
+    markup = InlineKeyboardMarkup(
+        inline_keyboard=keyboard
+    )
+    return markup
+
+
 def generate_inline_buttons_with_pagination(
         items: list,
         page: int = 0,
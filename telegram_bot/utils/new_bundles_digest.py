@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+
+from telegram_bot.config import (
+    NEW_BUNDLES_STREAM,
+    DIGEST_SUBSCRIBERS_KEY,
+    DIGEST_INTERVAL_SECONDS,
+    DIGEST_MAX_BUNDLES_IN_TEXT,
+    DIGEST_MAX_BUTTONS,
+    DEFAULT_TENANT
+)
+from telegram_bot.strings import NEW_BUNDLES_DIGEST, NEW_BUNDLES_DIGEST_MORE
+from utils.bundle_buttons import BundleButtons
+from utils.markups import new_bundles_digest_markup
+
+
+def subscribers_key(tenant: str) -> str:
+    """
+    Get Redis key of digest subscribers of a tenant. The default tenant keeps the original key.
+    """
+    return DIGEST_SUBSCRIBERS_KEY if tenant == DEFAULT_TENANT else f"{DIGEST_SUBSCRIBERS_KEY}:{tenant}"
+
+
+class NewBundlesDigest:
+    """
+    Class that consumes "new bundle" events from a Redis stream and sends
+    one aggregated digest per interval and tenant to every subscribed admin chat of the tenant.
+    """
+    group = "digest"
+    consumer = "bot"
+
+    def __init__(self, bot: Bot, redis: Redis, stream: str = NEW_BUNDLES_STREAM):
+        self.bot = bot
+        self.redis = redis
+        self.stream = stream
+        self.buttons = BundleButtons(redis)
+
+    async def subscribe(self, chat_id: int, tenant: str = DEFAULT_TENANT) -> None:
+        await self.redis.sadd(subscribers_key(tenant), chat_id)
+
+    async def unsubscribe(self, chat_id: int, tenant: str = DEFAULT_TENANT) -> None:
+        await self.redis.srem(subscribers_key(tenant), chat_id)
+
+    async def is_subscribed(self, chat_id: int, tenant: str = DEFAULT_TENANT) -> bool:
+        return bool(await self.redis.sismember(subscribers_key(tenant), chat_id))
+
+    async def run(self) -> None:
+        """
+        Consume events forever. A digest window opens on the first event and is
+        sent after DIGEST_INTERVAL_SECONDS; events are acknowledged only after sending,
+        so a restart re-delivers the pending window. Redis errors, also at start, are retried.
+        """
+        ready = False
+        while True:
+            try:
+                if not ready:
+                    await self.__create_group()
+                    await self.__drain_pending()
+                    ready = True
+                bundles, message_ids = await self.__collect_window()
+                if message_ids:
+                    await self.__send_digests(bundles)
+                    await self.redis.xack(self.stream, self.group, *message_ids)
+            except RedisError:
+                logging.exception("Failed to read new bundle events")
+                # The group is created again if Redis lost it, and unacknowledged events are re-sent
+                ready = False
+                await asyncio.sleep(5)
+
+    async def __create_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def __drain_pending(self) -> None:
+        while True:
+            response = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: "0"}, count=1000)
+            bundles, message_ids = {}, []
+            self.__parse(response, bundles, message_ids)
+            if not message_ids:
+                return
+            await self.__send_digests(bundles)
+            await self.redis.xack(self.stream, self.group, *message_ids)
+
+    async def __collect_window(self) -> tuple[dict[str, dict[str, int]], list[bytes]]:
+        bundles = {}
+        message_ids = []
+        window_end = None
+        while window_end is None or time.monotonic() < window_end:
+            if window_end is None:
+                block = 60000
+            else:
+                block = max(1, int((window_end - time.monotonic()) * 1000))
+            response = await self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=1000, block=block
+            )
+            self.__parse(response, bundles, message_ids)
+            if message_ids and window_end is None:
+                window_end = time.monotonic() + DIGEST_INTERVAL_SECONDS
+        return bundles, message_ids
+
+    @staticmethod
+    def __parse(response: list, bundles: dict[str, dict[str, int]], message_ids: list[bytes]) -> None:
+        for _, messages in response or []:
+            for message_id, fields in messages:
+                message_ids.append(message_id)
+                tenant = fields[b"tenant"].decode() if b"tenant" in fields else DEFAULT_TENANT
+                bundles.setdefault(tenant, {})[fields[b"bundle_id"].decode()] = int(fields[b"seen_at"])
+
+    async def __send_digests(self, bundles: dict[str, dict[str, int]]) -> None:
+        for tenant, seen in bundles.items():
+            await self.__send_digest(sorted(seen, key=seen.get), tenant)
+
+    async def __send_digest(self, bundles: list[str], tenant: str) -> None:
+        text = NEW_BUNDLES_DIGEST.format(
+            count=len(bundles),
+            minutes=max(1, DIGEST_INTERVAL_SECONDS // 60),
+            bundles="\n".join(bundles[:DIGEST_MAX_BUNDLES_IN_TEXT])
+        )
+        if len(bundles) > DIGEST_MAX_BUNDLES_IN_TEXT:
+            text += "\n" + NEW_BUNDLES_DIGEST_MORE.format(count=len(bundles) - DIGEST_MAX_BUNDLES_IN_TEXT)
+        buttons = bundles[:DIGEST_MAX_BUTTONS]
+        await self.buttons.remember(buttons)
+        await self.send_to_subscribers(text, new_bundles_digest_markup(buttons), tenant)
+
+    async def send_to_subscribers(
+            self,
+            text: str,
+            markup: InlineKeyboardMarkup = None,
+            tenant: str = DEFAULT_TENANT
+    ) -> None:
+        """
+        Send message to every subscribed admin chat of a tenant.
+        Args:
+            text (str): Message text.
+            markup (InlineKeyboardMarkup): Optional inline keyboard.
+            tenant (str): Tenant of the subscribers.
+        """
+        for chat_id in await self.redis.smembers(subscribers_key(tenant)):
+            try:
+                await self.bot.send_message(int(chat_id), text, reply_markup=markup)
+            except TelegramForbiddenError:
+                await self.unsubscribe(int(chat_id), tenant)
+            except TelegramAPIError:
+                logging.exception("Failed to send message to subscriber %s", chat_id)
+            await asyncio.sleep(0.05)
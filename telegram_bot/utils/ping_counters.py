@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+
+from telegram_bot.config import PING_FLUSH_INTERVAL_SECONDS, PING_COMPACT_INTERVAL_SECONDS
+from utils.database_connector import DatabaseConnector, MINUTE
+
+
+class PingCounters:
+    """
+    Class that counts application pings per minute in memory
+    and flushes the counters to the database rollups in batches,
+    together with the last check time of every pinged application unless track_last_pings is False
+    (the Redis allowance store collects check times itself and is their only writer then).
+    """
+
+    def __init__(
+            self,
+            db: DatabaseConnector,
+            flush_interval: int = PING_FLUSH_INTERVAL_SECONDS,
+            track_last_pings: bool = True
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.track_last_pings = track_last_pings
+        self.counters: dict[tuple[str, int], int] = {}
+        self.last_pings: dict[str, int] = {}
+        self.task: asyncio.Task | None = None
+
+    def hit(self, bundle_id: str, ping_time: int) -> None:
+        """
+        Count one ping. Only touches a dict, never awaits.
+        Args:
+            bundle_id (str): Application identifier e.g. com.example.app.
+            ping_time (int): Timestamp of the ping.
+        """
+        key = (bundle_id, ping_time - ping_time % MINUTE)
+        self.counters[key] = self.counters.get(key, 0) + 1
+        if self.track_last_pings:
+            self.last_pings[bundle_id] = ping_time
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write accumulated counters to the database. On failure the counters are merged back.
+        """
+        if not self.counters:
+            return
+        counters, self.counters = self.counters, {}
+        last_pings, self.last_pings = self.last_pings, {}
+        try:
+            await self.db.add_ping_counts(counters)
+        except Exception:  # noqa
+            logging.exception("Failed to flush %d ping counters", len(counters))
+            for key, count in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + count
+        if not last_pings:
+            return
+        try:
+            await self.db.set_last_access_times(last_pings)
+        except Exception:  # noqa
+            logging.exception("Failed to flush last check time of %d applications", len(last_pings))
+            for bundle_id, ping_time in last_pings.items():
+                self.last_pings[bundle_id] = max(ping_time, self.last_pings.get(bundle_id, 0))
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+async def run_ping_rollups_compaction(db: DatabaseConnector) -> None:
+    """
+    Downsample ping rollups forever. Must run in a single process, so it is started by the bot, not by the agent.
+    Args:
+        db (DatabaseConnector): Database connector.
+    """
+    while True:
+        try:
+            await db.compact_ping_rollups(int(time.time()))
+        except Exception:  # noqa
+            logging.exception("Failed to compact ping rollups")
+        await asyncio.sleep(PING_COMPACT_INTERVAL_SECONDS)
@@ -0,0 +1,169 @@
+import json
+import zlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseEventIsolation, BaseStorage, StateType, StorageKey
+from redis.asyncio import Redis
+
+from telegram_bot.config import SESSION_REDIS_URLS, SESSION_KEY_PREFIX, SESSION_TTL_SECONDS
+
+
+class Session:
+    """
+    FSM state and data of one chat cached for the duration of an update, with fields changed during it.
+    """
+    __slots__ = ("state", "data", "changes")
+
+    def __init__(self, state: str | None, data: dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.changes: dict[str, str | None] = {}
+
+
+class ShardedSessionStorage(BaseStorage):
+    """
+    FSM storage that keeps state and data of a chat in one Redis hash.
+    Sessions are spread over shards by key, the chat part of the key is a hash tag,
+    so the layout also works behind Redis Cluster. Inside SessionScope a session is
+    read in one pipelined call and changes are written in one pipelined call per shard.
+    """
+
+    def __init__(self, shards: list[Redis], prefix: str = SESSION_KEY_PREFIX, ttl: int = SESSION_TTL_SECONDS):
+        self.shards = shards
+        self.prefix = prefix
+        self.ttl = ttl
+        self.scope: ContextVar[dict[str, Session] | None] = ContextVar("session_scope", default=None)
+
+    @classmethod
+    def from_urls(cls, urls: list[str] = SESSION_REDIS_URLS, **kwargs: Any) -> "ShardedSessionStorage":
+        """
+        Create storage with a connection pool per shard.
+        Args:
+            urls (list[str]): Redis URLs of shards.
+        Returns:
+            ShardedSessionStorage: Storage.
+        """
+        return cls([Redis.from_url(url) for url in urls], **kwargs)
+
+    def create_isolation(self) -> "SessionScope":
+        return SessionScope(self)
+
+    def build_key(self, key: StorageKey) -> str:
+        parts = [str(key.bot_id), str(key.chat_id)]
+        if key.thread_id:
+            parts.append(str(key.thread_id))
+        parts.append(str(key.user_id))
+        if key.destiny != DEFAULT_DESTINY:
+            parts.append(key.destiny)
+        return f"{self.prefix}:{{{':'.join(parts)}}}"
+
+    def shard(self, redis_key: str) -> Redis:
+        if len(self.shards) == 1:
+            return self.shards[0]
+        return self.shards[zlib.crc32(redis_key.encode()) % len(self.shards)]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        session = await self.__change(key, "state", value)
+        if session is not None:
+            session.state = value
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self.__session(key)).state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        session = await self.__change(key, "data", json.dumps(data) if data else None)
+        if session is not None:
+            session.data = dict(data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self.__session(key)).data)
+
+    async def flush(self, sessions: dict[str, Session]) -> None:
+        """
+        Write changed fields of sessions, one pipeline per shard.
+        Args:
+            sessions (dict[str, Session]): Sessions by Redis key.
+        """
+        pipelines = {}
+        for redis_key, session in sessions.items():
+            if not session.changes:
+                continue
+            shard = self.shard(redis_key)
+            if shard not in pipelines:
+                pipelines[shard] = shard.pipeline(transaction=False)
+            self.__queue_changes(pipelines[shard], redis_key, session.changes)
+        for pipe in pipelines.values():
+            async with pipe:
+                await pipe.execute()
+
+    async def close(self) -> None:
+        for shard in self.shards:
+            await shard.aclose(close_connection_pool=True)
+
+    async def __session(self, key: StorageKey) -> Session:
+        redis_key = self.build_key(key)
+        sessions = self.scope.get()
+        if sessions is not None and redis_key in sessions:
+            return sessions[redis_key]
+
+        async with self.shard(redis_key).pipeline(transaction=False) as pipe:
+            pipe.hmget(redis_key, "state", "data")
+            pipe.expire(redis_key, self.ttl)
+            (state, data), _ = await pipe.execute()
+        session = Session(state.decode() if state is not None else None, json.loads(data) if data is not None else {})
+        if sessions is not None:
+            sessions[redis_key] = session
+        return session
+
+    async def __change(self, key: StorageKey, field: str, value: str | None) -> Session | None:
+        """
+        Record field change in the update scope, or write it at once outside of it.
+        Returns:
+            Session | None: Cached session to update, or None if the change is already written.
+        """
+        if self.scope.get() is None:
+            redis_key = self.build_key(key)
+            async with self.shard(redis_key).pipeline(transaction=False) as pipe:
+                self.__queue_changes(pipe, redis_key, {field: value})
+                await pipe.execute()
+            return None
+
+        session = await self.__session(key)
+        session.changes[field] = value
+        return session
+
+    def __queue_changes(self, pipe, redis_key: str, changes: dict[str, str | None]) -> None:
+        values = {field: value for field, value in changes.items() if value is not None}
+        removed = [field for field, value in changes.items() if value is None]
+        if values:
+            pipe.hset(redis_key, mapping=values)
+        if removed:
+            pipe.hdel(redis_key, *removed)
+        pipe.expire(redis_key, self.ttl)
+
+
+class SessionScope(BaseEventIsolation):
+    """
+    Events isolation that caches sessions for one update and flushes their changes after it is handled.
+    Does not lock, as the default isolation of the dispatcher.
+    """
+
+    def __init__(self, storage: ShardedSessionStorage):
+        self.storage = storage
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        sessions = {}
+        token = self.storage.scope.set(sessions)
+        try:
+            yield
+        finally:
+            self.storage.scope.reset(token)
+            await self.storage.flush(sessions)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,66 @@
+import time
+
+from telegram_bot.config import DEFAULT_TENANT, DEFAULT_BUNDLE_POLICY
+from utils.bundle_rules import BundleRules, default_policy_setting
+from utils.database_connector import DatabaseConnector
+
+
+class RateLimiter:
+    """
+    Token bucket that allows a number of requests per second with bursts of up to one second.
+    Only does arithmetic, never awaits.
+    """
+    __slots__ = ("rate", "tokens", "updated_at")
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Tenant:
+    """
+    Rules and quotas of one tenant, as used by the agent.
+    """
+    __slots__ = ("name", "rules", "max_bundles", "limiter")
+
+    def __init__(self, name: str, rules: BundleRules, max_bundles: int = None, limiter: RateLimiter = None):
+        self.name = name
+        self.rules = rules
+        self.max_bundles = max_bundles
+        self.limiter = limiter
+
+
+async def load_tenants(db: DatabaseConnector, previous: dict[str, Tenant] = None) -> dict[str, Tenant]:
+    """
+    Load rules and quotas of all tenants. The default tenant always exists.
+    Args:
+        db (DatabaseConnector): Database connector.
+        previous (dict[str, Tenant]): Currently used tenants, their rate limiters are kept if the rate is unchanged.
+    Returns:
+        dict[str, Tenant]: Tenants by name.
+    """
+    previous = previous or {}
+    quotas = {name: (max_bundles, max_requests_per_second) for name, max_bundles, max_requests_per_second in await db.get_tenants()}
+    quotas.setdefault(DEFAULT_TENANT, (None, None))
+
+    tenants = {}
+    for name, (max_bundles, max_requests_per_second) in quotas.items():
+        default_policy = await db.get_setting(default_policy_setting(name), DEFAULT_BUNDLE_POLICY)
+        rules = BundleRules.from_rows(default_policy, await db.get_bundle_rules(name))
+        limiter = None
+        if max_requests_per_second:
+            limiter = previous[name].limiter if name in previous else None
+            if limiter is None or limiter.rate != max_requests_per_second:
+                limiter = RateLimiter(max_requests_per_second)
+        tenants[name] = Tenant(name, rules, max_bundles or None, limiter)
+    return tenants